@@ -1,12 +1,83 @@
+import os
+import tempfile
+import time
+from datetime import date
+from typing import Optional
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
-from database import Database
 
-db = Database()
+from export import EXPORT_FORMATS, WRITERS, Workbook
+
+# Количество команд на одной странице списка
+ADMIN_TEAMS_PAGE_SIZE = 5
+
+# Фильтры списка команд: ключ используется в callback_data
+STATUS_FILTERS = {
+    'all': "Все",
+    'pending': "⏳ Ожидают",
+    'approved': "✅ Одобрены",
+    'rejected': "❌ Отклонены",
+}
+
+STATUS_LABELS = {
+    'pending': "Ожидает подтверждения",
+    'approved': "Одобрено",
+    'rejected': "Отклонено",
+}
+
+# Telegram ограничивает сообщение 4096 символами (в единицах UTF-16). Свободный текст команды
+# на странице списка обрезается, а если страница всё равно не помещается, каждой команде
+# достаётся равная доля лимита
+MESSAGE_LIMIT = 4096
+TEAM_FIELD_LIMIT = 200
+TEAM_PLAYERS_LIMIT = 10
+PLAYER_FIELD_LIMIT = 64
+
+# Сколько секунд показывать закэшированную статистику
+STATS_CACHE_SECONDS = 10
+
+# (время получения, статистика)
+_stats_cache = (0.0, None)
+
+def utf16_len(text: str) -> int:
+    """Длина текста так, как её считает Telegram."""
+    return len(text.encode('utf-16-le')) // 2
+
+def shorten(text, limit: int) -> str:
+    """Обрезает текст до limit единиц UTF-16, заменяя хвост многоточием."""
+    text = str(text)
+    if utf16_len(text) <= limit:
+        return text
+    text = text[:limit - 1]
+    # Символы вне BMP (эмодзи) занимают две единицы: убираем хвост, пока не уложимся
+    while utf16_len(text) > limit - 1:
+        text = text[:len(text) - max(1, (utf16_len(text) - limit + 1) // 2)]
+    return text + "…"
+
+def render_team_entry(number: int, team: dict) -> str:
+    """Блок команды на странице списка с обрезанными полями и составом."""
+    players = team['players']
+    players_list = "\n".join(
+        f"  • {shorten(p[0], PLAYER_FIELD_LIMIT)} – {shorten(p[1], PLAYER_FIELD_LIMIT)}"
+        for p in players[:TEAM_PLAYERS_LIMIT]
+    )
+    if len(players) > TEAM_PLAYERS_LIMIT:
+        players_list += f"\n  …и ещё {len(players) - TEAM_PLAYERS_LIMIT}"
+    return (
+        f"{number}. 🎮 {shorten(team['team_name'], TEAM_FIELD_LIMIT)}\n"
+        f"📅 Дата регистрации: {team['registration_date']}\n"
+        f"📱 Контакт капитана: {shorten(team['captain_contact'], TEAM_FIELD_LIMIT)}\n"
+        f"📊 Статус: {STATUS_LABELS.get(team['status'], team['status'])}\n"
+        f"💭 Комментарий: {shorten(team['admin_comment'] or 'Нет', TEAM_FIELD_LIMIT)}\n"
+        f"👥 Игроки:\n{players_list}\n"
+    )
 
 async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показать админ-панель."""
-    if not db.is_admin(update.effective_user.id):
+    db = context.bot_data['db']
+    if not await db.is_admin(update.effective_user.id):
         await update.message.reply_text("У вас нет доступа к админ-панели.")
         return
 
@@ -22,61 +93,126 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         reply_markup=reply_markup
     )
 
+async def show_teams_page(query, context: ContextTypes.DEFAULT_TYPE, status: str = 'all',
+                          after_id: Optional[int] = None, before_id: Optional[int] = None) -> None:
+    """Отрисовать страницу списка команд в сообщении с кнопками."""
+    db = context.bot_data['db']
+    teams, has_more = await db.get_teams_page(
+        status=None if status == 'all' else status,
+        limit=ADMIN_TEAMS_PAGE_SIZE,
+        after_id=after_id,
+        before_id=before_id
+    )
+    # Запоминаем страницу, чтобы перерисовать её после действия с командой
+    context.user_data['admin_teams_page'] = [status, after_id, before_id]
+
+    if before_id is not None:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after_id is not None, has_more
+
+    selected = set(context.user_data.get('admin_selected_teams', []))
+
+    header = f"📋 Команды ({STATUS_FILTERS[status]})\n"
+    entries = []
+    footer = []
+    keyboard = [[
+        InlineKeyboardButton(("• " if key == status else "") + label, callback_data=f"admin_teams_{key}")
+        for key, label in STATUS_FILTERS.items()
+    ]]
+
+    if not teams:
+        footer.append("Команд не найдено.")
+
+    for number, team in enumerate(teams, start=1):
+        entries.append(render_team_entry(number, team))
+        keyboard.append([
+            InlineKeyboardButton(("☑️" if team['id'] in selected else "⬜") + f" {number}",
+                                 callback_data=f"select_team_{team['id']}"),
+            InlineKeyboardButton(f"✅ {number}", callback_data=f"approve_team_{team['id']}"),
+            InlineKeyboardButton(f"❌ {number}", callback_data=f"reject_team_{team['id']}"),
+            InlineKeyboardButton(f"💬 {number}", callback_data=f"comment_team_{team['id']}")
+        ])
+
+    navigation = []
+    if has_prev and teams:
+        navigation.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"admin_teams_{status}_prev_{teams[0]['id']}"))
+    elif has_prev and after_id is not None:
+        # На странице никого не осталось (например, после смены статусов) — возвращаемся от курсора
+        navigation.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"admin_teams_{status}_prev_{after_id}"))
+    if has_next and teams:
+        navigation.append(InlineKeyboardButton("Вперёд ➡️", callback_data=f"admin_teams_{status}_next_{teams[-1]['id']}"))
+    if navigation:
+        keyboard.append(navigation)
+
+    if selected:
+        footer.append(f"Выбрано команд: {len(selected)}")
+        keyboard.append([
+            InlineKeyboardButton(f"✅ Одобрить выбранные ({len(selected)})", callback_data="bulk_approve"),
+            InlineKeyboardButton(f"❌ Отклонить выбранные ({len(selected)})", callback_data="bulk_reject"),
+        ])
+        keyboard.append([InlineKeyboardButton("Снять выбор", callback_data="bulk_clear")])
+    if status in ('all', 'pending'):
+        keyboard.append([InlineKeyboardButton("✅ Одобрить все ожидающие", callback_data="bulk_pending")])
+
+    text = "\n".join([header, *entries, *footer])
+    if utf16_len(text) > MESSAGE_LIMIT:
+        # Многословные команды делят лимит поровну, чтобы страница оставалась рабочей
+        overhead = utf16_len(text) - sum(utf16_len(entry) for entry in entries)
+        budget = (MESSAGE_LIMIT - overhead) // len(entries)
+        text = "\n".join([header, *(shorten(entry, budget) for entry in entries), *footer])
+
+    try:
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    except BadRequest as e:
+        # Повторное нажатие на тот же фильтр не меняет сообщение
+        if "Message is not modified" not in str(e):
+            raise
+
+async def show_current_teams_page(query, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Перерисовать страницу списка команд, открытую администратором последней."""
+    status, after_id, before_id = context.user_data.get('admin_teams_page', ['all', None, None])
+    await show_teams_page(query, context, status, after_id, before_id)
+
 async def admin_teams_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Показать список всех команд."""
+    """Показать список команд постранично.
+
+    callback_data: admin_teams_list, admin_teams_{фильтр}, admin_teams_{фильтр}_{next|prev}_{id команды}.
+    """
     query = update.callback_query
-    if not db.is_admin(query.from_user.id):
+    db = context.bot_data['db']
+    if not await db.is_admin(query.from_user.id):
         await query.answer("У вас нет доступа к этой функции.")
         return
 
-    teams = db.get_all_teams()
-    
-    if not teams:
-        await query.edit_message_text("Зарегистрированных команд пока нет.")
-        return
-
-    for team in teams:
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Одобрить", callback_data=f"approve_team_{team['id']}"),
-                InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_team_{team['id']}")
-            ],
-            [InlineKeyboardButton("💬 Комментарий", callback_data=f"comment_team_{team['id']}")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        players_list = "\n".join([f"• {p[0]} – {p[1]}" for p in team['players']])
-        message = (
-            f"🎮 Команда: {team['team_name']}\n"
-            f"📅 Дата регистрации: {team['registration_date']}\n"
-            f"📱 Контакт капитана: {team['captain_contact']}\n"
-            f"📊 Статус: {team['status']}\n"
-            f"💭 Комментарий: {team['admin_comment'] or 'Нет'}\n\n"
-            f"👥 Игроки:\n{players_list}"
-        )
-        
-        await query.message.reply_text(message, reply_markup=reply_markup)
+    parts = query.data.split('_')
+    status = parts[2] if parts[2] in STATUS_FILTERS else 'all'
+    after_id = before_id = None
+    if len(parts) == 5:
+        if parts[3] == 'next':
+            after_id = int(parts[4])
+        else:
+            before_id = int(parts[4])
 
+    await show_teams_page(query, context, status, after_id, before_id)
     await query.answer()
 
 async def handle_team_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработка действий с командами."""
     query = update.callback_query
-    if not db.is_admin(query.from_user.id):
+    db = context.bot_data['db']
+    if not await db.is_admin(query.from_user.id):
         await query.answer("У вас нет доступа к этой функции.")
         return
 
     action, team_id = query.data.split('_')[0], int(query.data.split('_')[2])
     
-    if action == "approve":
-        db.update_team_status(team_id, "approved")
-        await query.edit_message_reply_markup(reply_markup=None)
-        await query.message.reply_text(f"✅ Команда одобрена!")
-    
-    elif action == "reject":
-        db.update_team_status(team_id, "rejected")
-        await query.edit_message_reply_markup(reply_markup=None)
-        await query.message.reply_text(f"❌ Команда отклонена!")
+    if action in ("approve", "reject"):
+        await db.update_team_status(team_id, "approved" if action == "approve" else "rejected")
+        # Перерисовываем текущую страницу списка вместо отдельного сообщения
+        await show_current_teams_page(query, context)
+        await query.answer("✅ Команда одобрена!" if action == "approve" else "❌ Команда отклонена!")
+        return
     
     elif action == "comment":
         context.user_data['commenting_team'] = team_id
@@ -87,4 +223,267 @@ async def handle_team_action(update: Update, context: ContextTypes.DEFAULT_TYPE)
             ]])
         )
 
-    await query.answer()
\ No newline at end of file
+    await query.answer()
+
+async def handle_bulk_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Массовая модерация: выбор команд на страницах и смена статуса одной транзакцией.
+
+    callback_data: select_team_{id}, bulk_approve, bulk_reject, bulk_clear,
+    bulk_pending (запрос подтверждения), bulk_pending_confirm, bulk_cancel.
+    """
+    query = update.callback_query
+    db = context.bot_data['db']
+    if not await db.is_admin(query.from_user.id):
+        await query.answer("У вас нет доступа к этой функции.")
+        return
+
+    # Список, а не множество: user_data сохраняется в JSON
+    selected = context.user_data.setdefault('admin_selected_teams', [])
+
+    if query.data.startswith("select_team_"):
+        team_id = int(query.data.split('_')[2])
+        if team_id in selected:
+            selected.remove(team_id)
+        else:
+            selected.append(team_id)
+        await show_current_teams_page(query, context)
+        await query.answer()
+        return
+
+    action = query.data[len("bulk_"):]
+
+    if action in ("approve", "reject"):
+        if not selected:
+            await query.answer("Не выбрано ни одной команды.")
+            return
+        team_ids = list(selected)
+        changed = await db.update_team_status_many(team_ids, "approved" if action == "approve" else "rejected")
+        selected.clear()
+        await show_current_teams_page(query, context)
+        await query.message.reply_text(
+            f"✅ Одобрено команд: {changed} из {len(team_ids)} выбранных" if action == "approve"
+            else f"❌ Отклонено команд: {changed} из {len(team_ids)} выбранных"
+        )
+        await query.answer()
+
+    elif action == "clear":
+        selected.clear()
+        await show_current_teams_page(query, context)
+        await query.answer()
+
+    elif action == "pending":
+        stats = await db.get_stats()
+        pending = stats['teams'].get('pending', 0)
+        if not pending:
+            await query.answer("Нет команд, ожидающих подтверждения.")
+            return
+        await query.edit_message_text(
+            f"Одобрить все команды, ожидающие подтверждения ({pending})?",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("✅ Да, одобрить", callback_data="bulk_pending_confirm"),
+                InlineKeyboardButton("Отмена", callback_data="bulk_cancel"),
+            ]])
+        )
+        await query.answer()
+
+    elif action == "pending_confirm":
+        changed = await db.update_pending_teams("approved")
+        await show_current_teams_page(query, context)
+        await query.message.reply_text(f"✅ Одобрено ожидающих команд: {changed}")
+        await query.answer()
+
+    else:
+        await show_current_teams_page(query, context)
+        await query.answer()
+
+async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показать статистику регистраций."""
+    global _stats_cache
+    query = update.callback_query
+    db = context.bot_data['db']
+    if not await db.is_admin(query.from_user.id):
+        await query.answer("У вас нет доступа к этой функции.")
+        return
+
+    # Счётчики и так читаются за O(1), кэш лишь снимает нагрузку от частых нажатий
+    cached_at, stats = _stats_cache
+    if stats is None or time.monotonic() - cached_at > STATS_CACHE_SECONDS:
+        stats = await db.get_stats()
+        _stats_cache = (time.monotonic(), stats)
+
+    lines = [
+        "📊 Статистика\n",
+        f"🎮 Команд: {stats['teams_total']}",
+    ]
+    for status, label in STATUS_LABELS.items():
+        lines.append(f"  • {label}: {stats['teams'].get(status, 0)}")
+    lines.append(f"👥 Игроков: {stats['players']}")
+    lines.append(f"📈 В среднем игроков в команде: {stats['avg_players']:.1f}")
+
+    if stats['by_day']:
+        lines.append("\n📅 Регистрации по дням (UTC):")
+        lines.extend(f"  • {day}: {count}" for day, count in stats['by_day'])
+    if stats['by_hour']:
+        lines.append("\n🕐 Регистрации за последние 24 часа (UTC):")
+        lines.extend(f"  • {hour[11:]}: {count}" for hour, count in stats['by_hour'])
+
+    try:
+        await query.edit_message_text(
+            "\n".join(lines),
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Обновить", callback_data="admin_stats")]])
+        )
+    except BadRequest as e:
+        if "Message is not modified" not in str(e):
+            raise
+    await query.answer()
+
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Найти команды по названию, контакту капитана, никнейму или username игрока: /find <запрос>."""
+    db = context.bot_data['db']
+    if not await db.is_admin(update.effective_user.id):
+        await update.message.reply_text("У вас нет доступа к этой функции.")
+        return
+
+    query = " ".join(context.args)
+    if not query:
+        await update.message.reply_text("Использование: /find <название команды, никнейм или @username>")
+        return
+
+    teams = await db.search_teams(query)
+    if not teams:
+        await update.message.reply_text(f"🔎 По запросу «{query}» ничего не найдено.")
+        return
+
+    lines = [f"🔎 Результаты поиска «{query}»:\n"]
+    for number, team in enumerate(teams, start=1):
+        lines.append(
+            f"{number}. 🎮 {team['team_name']} (ID {team['id']})\n"
+            f"📊 Статус: {STATUS_LABELS.get(team['status'], team['status'])}\n"
+            f"📱 Контакт капитана: {team['captain_contact']}"
+        )
+        if team['matches']:
+            lines.append("👥 Совпавшие игроки:\n" + "\n".join(f"  • {player}" for player in team['matches']))
+        lines.append("")
+    await update.message.reply_text("\n".join(lines))
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Подготовить рассылку всем игрокам ожидающих и одобренных команд: /broadcast <текст>."""
+    db = context.bot_data['db']
+    if not await db.is_admin(update.effective_user.id):
+        await update.message.reply_text("У вас нет доступа к этой функции.")
+        return
+
+    # Берём текст целиком, чтобы сохранить переносы строк
+    parts = update.message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        await update.message.reply_text("Использование: /broadcast <текст сообщения>\nХод рассылок: /broadcasts")
+        return
+
+    context.user_data['broadcast_draft'] = parts[1]
+    await update.message.reply_text(
+        f"📣 Рассылка всем игрокам ожидающих и одобренных команд:\n\n{parts[1]}",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("📣 Отправить", callback_data="broadcast_confirm"),
+            InlineKeyboardButton("Отмена", callback_data="broadcast_cancel"),
+        ]])
+    )
+
+async def handle_broadcast_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Подтверждение или отмена подготовленной рассылки."""
+    query = update.callback_query
+    db = context.bot_data['db']
+    if not await db.is_admin(query.from_user.id):
+        await query.answer("У вас нет доступа к этой функции.")
+        return
+
+    text = context.user_data.pop('broadcast_draft', None)
+    if query.data == "broadcast_confirm" and text:
+        # Уведомления ставятся в очередь и отправляются фоновой задачей Notifier
+        broadcast_id, recipients = await db.create_broadcast(text, query.from_user.id)
+        await query.edit_message_text(
+            f"📣 Рассылка #{broadcast_id} поставлена в очередь, получателей: {recipients}.\nХод рассылки: /broadcasts"
+        )
+    elif query.data == "broadcast_confirm":
+        await query.edit_message_text("Рассылка уже отправлена или отменена.")
+    else:
+        await query.edit_message_text("Рассылка отменена.")
+    await query.answer()
+
+async def broadcasts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показать ход последних рассылок."""
+    db = context.bot_data['db']
+    if not await db.is_admin(update.effective_user.id):
+        await update.message.reply_text("У вас нет доступа к этой функции.")
+        return
+
+    broadcasts = await db.get_broadcasts_progress()
+    if not broadcasts:
+        await update.message.reply_text("Рассылок ещё не было.")
+        return
+
+    lines = ["📣 Последние рассылки:\n"]
+    for broadcast in broadcasts:
+        states = broadcast['states']
+        preview = broadcast['text'] if len(broadcast['text']) <= 40 else broadcast['text'][:40] + "…"
+        lines.append(
+            f"#{broadcast['id']} {time.strftime('%Y-%m-%d %H:%M', time.gmtime(broadcast['created_at']))} UTC — {preview}\n"
+            f"  Получателей: {broadcast['recipients']}, доставлено: {states.get('sent', 0)}, "
+            f"в очереди: {states.get('pending', 0) + states.get('sending', 0)}, ошибок: {states.get('failed', 0)}"
+        )
+    await update.message.reply_text("\n".join(lines))
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Выгрузить команды и игроков файлом.
+
+    /export [csv|xlsx] [статус] [ГГГГ-ММ-ДД] [ГГГГ-ММ-ДД] — даты включительно, по UTC.
+    """
+    db = context.bot_data['db']
+    if not await db.is_admin(update.effective_user.id):
+        await update.message.reply_text("У вас нет доступа к этой функции.")
+        return
+
+    file_format, status, dates = 'csv', None, []
+    try:
+        for arg in context.args:
+            if arg.lower() in EXPORT_FORMATS:
+                file_format = arg.lower()
+            elif arg.lower() in STATUS_LABELS:
+                status = arg.lower()
+            elif arg.lower() == 'all':
+                status = None
+            else:
+                dates.append(date.fromisoformat(arg))
+        if len(dates) > 2:
+            raise ValueError(arg)
+    except ValueError:
+        await update.message.reply_text(
+            "Использование: /export [csv|xlsx] [pending|approved|rejected] [ГГГГ-ММ-ДД] [ГГГГ-ММ-ДД]"
+        )
+        return
+    date_from = dates[0] if dates else None
+    date_to = dates[1] if len(dates) > 1 else None
+
+    if file_format == 'xlsx' and Workbook is None:
+        await update.message.reply_text("Выгрузка в XLSX недоступна: не установлен openpyxl. Используйте /export csv.")
+        return
+
+    fd, path = tempfile.mkstemp(suffix=f".{file_format}")
+    os.close(fd)
+    try:
+        # Строки пишутся в файл по мере чтения из базы и не накапливаются в памяти
+        count = await db.export(WRITERS[file_format], path, status, date_from, date_to)
+        filename = "teams"
+        if status:
+            filename += f"_{status}"
+        if date_from:
+            filename += f"_{date_from.isoformat()}"
+        if date_to:
+            filename += f"_{date_to.isoformat()}"
+        with open(path, 'rb') as file:
+            await update.message.reply_document(
+                document=file,
+                filename=f"{filename}.{file_format}",
+                caption=f"📤 Выгружено строк: {count}"
+            )
+    finally:
+        os.remove(path)
@@ -0,0 +1,252 @@
+# async_database.py
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import date
+from typing import Callable, FrozenSet, Iterator, List, Optional, Dict, Tuple, AsyncIterator
+
+from database import Database, TEAMS_PAGE_SIZE, SEARCH_LIMIT
+from metrics import DB_LATENCY, DB_ERRORS
+from team_cache import TeamCache
+
+# Количество потоков для чтения; запись всегда идёт через один поток
+DB_READ_WORKERS = int(os.environ.get("DB_READ_WORKERS", 4))
+# Сколько ждать, собирая записи в одну транзакцию (group commit), секунд
+GROUP_COMMIT_DELAY = float(os.environ.get("GROUP_COMMIT_DELAY", 0.005))
+# Максимум операций в одной транзакции
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("GROUP_COMMIT_MAX_BATCH", 500))
+
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database.
+
+    Чтение выполняется в пуле потоков, запись — в единственном потоке-писателе,
+    поэтому обработчики не блокируют цикл событий на дисковом вводе-выводе,
+    а запросы на запись не конкурируют друг с другом за блокировку SQLite.
+    """
+
+    def __init__(self, db: Database, read_workers: int = DB_READ_WORKERS):
+        self.db = db
+        # Кэш «Проверить статус регистрации»; сбрасывается методами записи ниже
+        self.team_cache = TeamCache()
+        self._reader = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        # Операции, ожидающие group commit: (метод Database, аргументы, future вызывающего, время постановки)
+        self._pending_writes: List[Tuple[Callable, tuple, asyncio.Future, float]] = []
+        self._group_commit_task: Optional[asyncio.Task] = None
+
+    async def _read(self, func, *args, **kwargs):
+        return await self._run(self._reader, func, *args, **kwargs)
+
+    async def _write(self, func, *args, **kwargs):
+        return await self._run(self._writer, func, *args, **kwargs)
+
+    async def _run(self, executor: ThreadPoolExecutor, func, *args, **kwargs):
+        # Метрики пишутся в потоке цикла событий, поэтому счётчикам не нужны блокировки
+        name = func.__name__
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args, **kwargs))
+        except Exception:
+            DB_ERRORS.labels(name).inc()
+            raise
+        finally:
+            DB_LATENCY.labels(name).observe(time.perf_counter() - started)
+
+    def _submit(self, operation: Callable, *args) -> asyncio.Future:
+        """Ставит операцию в очередь group commit и возвращает future с её результатом."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_writes.append((operation, args, future, time.perf_counter()))
+        if self._group_commit_task is None or self._group_commit_task.done():
+            self._group_commit_task = loop.create_task(self._group_commit())
+        return future
+
+    async def _group_commit(self):
+        """Собирает операции, накопившиеся за GROUP_COMMIT_DELAY, и фиксирует их одной транзакцией."""
+        await asyncio.sleep(GROUP_COMMIT_DELAY)
+        while self._pending_writes:
+            batch = self._pending_writes[:GROUP_COMMIT_MAX_BATCH]
+            self._pending_writes = self._pending_writes[GROUP_COMMIT_MAX_BATCH:]
+            try:
+                results = await self._write(self.db.execute_batch, [(operation, args) for operation, args, _, _ in batch])
+            except Exception as e:
+                # Транзакция не прошла целиком — сообщаем об ошибке всем её участникам
+                results = [e] * len(batch)
+            finished = time.perf_counter()
+            for (operation, _, future, queued_at), result in zip(batch, results):
+                # Время операции — от постановки в очередь до фиксации транзакции
+                DB_LATENCY.labels(operation.__name__).observe(finished - queued_at)
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    DB_ERRORS.labels(operation.__name__).inc()
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def register_team(self, team_name: str, players: List[Dict[str, str]], captain_contact: str) -> int:
+        try:
+            return await self._submit(self.db._insert_team, team_name, players, captain_contact)
+        finally:
+            # У игроков нового состава могла быть закэширована «команда не найдена»
+            self.team_cache.invalidate_users(player['telegram_id'] for player in players)
+
+    async def get_team_status(self, team_name: str) -> Optional[dict]:
+        return await self._read(self.db.get_team_status, team_name)
+
+    async def get_team_by_telegram_id(self, telegram_id: int) -> Optional[dict]:
+        found, team = self.team_cache.get(telegram_id)
+        if found:
+            return team
+        generation = self.team_cache.generation
+        team = await self._read(self.db.get_team_by_telegram_id, telegram_id)
+        self.team_cache.put(telegram_id, team, generation)
+        return team
+
+    async def add_admin(self, telegram_id: int, username: str) -> bool:
+        return await self._write(self.db.add_admin, telegram_id, username)
+
+    async def is_admin(self, telegram_id: int) -> bool:
+        # Список администраторов хранится в памяти — поток для этого не нужен
+        return self.db.is_admin(telegram_id)
+
+    async def get_admin_ids(self) -> FrozenSet[int]:
+        return self.db.get_admin_ids()
+
+    async def load_admins(self):
+        return await self._read(self.db.load_admins)
+
+    async def update_team_status(self, team_id: int, status: str, comment: str = None) -> bool:
+        try:
+            return await self._submit(self.db._set_team_status, team_id, status, comment) > 0
+        finally:
+            self.team_cache.invalidate_teams([team_id])
+
+    async def update_team_status_many(self, team_ids: List[int], status: str) -> int:
+        try:
+            return await self._submit(self.db._set_team_status_many, team_ids, status)
+        finally:
+            self.team_cache.invalidate_teams(team_ids)
+
+    async def update_pending_teams(self, status: str) -> int:
+        try:
+            return await self._submit(self.db._set_pending_teams_status, status)
+        finally:
+            self.team_cache.invalidate_status('pending')
+
+    async def search_teams(self, query: str, limit: int = SEARCH_LIMIT) -> List[dict]:
+        return await self._read(self.db.search_teams, query, limit)
+
+    async def find_registered_players(self, telegram_ids: List[int], usernames: List[str]) -> List[dict]:
+        return await self._read(self.db.find_registered_players, telegram_ids, usernames)
+
+    async def get_players_to_verify(self, after_id: int, limit: int) -> List[dict]:
+        return await self._read(self.db.get_players_to_verify, after_id, limit)
+
+    async def get_checkpoint(self, name: str) -> Optional[Tuple[int, float]]:
+        return await self._read(self.db.get_checkpoint, name)
+
+    async def save_verification_batch(self, name: str, results: List[Tuple[int, int, Optional[int], str]],
+                                      verified_at: float, position: int, cycle_started_at: float):
+        try:
+            return await self._submit(self.db._save_verification_batch, name, results, verified_at, position,
+                                      cycle_started_at)
+        finally:
+            # Проверка могла впервые записать telegram_id игрока
+            self.team_cache.invalidate_teams(team_id for _, team_id, _, _ in results)
+            self.team_cache.invalidate_users(telegram_id for _, _, telegram_id, _ in results)
+
+    async def get_noncompliant_teams(self, since: float) -> List[dict]:
+        return await self._read(self.db.get_noncompliant_teams, since)
+
+    async def create_broadcast(self, text: str, created_by: int) -> Tuple[int, int]:
+        return await self._submit(self.db._insert_broadcast, text, created_by)
+
+    async def claim_notifications(self, limit: int) -> List[dict]:
+        return await self._submit(self.db._claim_notifications, limit)
+
+    async def finish_notifications(self, results: List[Tuple[int, str, Optional[str]]]):
+        return await self._submit(self.db._finish_notifications, results)
+
+    async def fail_interrupted_notifications(self) -> int:
+        return await self._write(self.db.fail_interrupted_notifications)
+
+    async def get_broadcasts_progress(self, limit: int = 5) -> List[dict]:
+        return await self._read(self.db.get_broadcasts_progress, limit)
+
+    async def team_name_exists(self, team_name: str) -> bool:
+        return await self._read(self.db.team_name_exists, team_name)
+
+    async def get_all_teams(self) -> List[dict]:
+        return await self._read(self.db.get_all_teams)
+
+    async def get_teams_page(self, status: Optional[str] = None, limit: int = TEAMS_PAGE_SIZE,
+                             after_id: Optional[int] = None, before_id: Optional[int] = None) -> Tuple[List[dict], bool]:
+        return await self._read(self.db.get_teams_page, status, limit, after_id, before_id)
+
+    async def iter_teams(self, status: Optional[str] = None, page_size: int = TEAMS_PAGE_SIZE) -> AsyncIterator[dict]:
+        """Асинхронный вариант Database.iter_teams: страницы запрашиваются по мере чтения."""
+        after_id = None
+        while True:
+            teams, has_more = await self.get_teams_page(status, page_size, after_id=after_id)
+            for team in teams:
+                yield team
+            if not has_more:
+                return
+            after_id = teams[-1]['id']
+
+    async def get_cached_telegram_id(self, username: str) -> Optional[Tuple[Optional[int], float]]:
+        return await self._read(self.db.get_cached_telegram_id, username)
+
+    async def save_cached_telegram_id(self, username: str, telegram_id: Optional[int], resolved_at: float):
+        return await self._write(self.db.save_cached_telegram_id, username, telegram_id, resolved_at)
+
+    async def get_known_telegram_ids(self, limit: int) -> List[Tuple[str, int]]:
+        return await self._read(self.db.get_known_telegram_ids, limit)
+
+    async def get_channel_members(self, since: float) -> List[Tuple[int, str, float]]:
+        return await self._read(self.db.get_channel_members, since)
+
+    async def save_channel_member(self, user_id: int, status: str, updated_at: float):
+        return await self._write(self.db.save_channel_member, user_id, status, updated_at)
+
+    async def get_user_data(self) -> List[Tuple[int, str]]:
+        return await self._read(self.db.get_user_data)
+
+    async def get_conversations(self, name: str) -> List[Tuple[str, str]]:
+        return await self._read(self.db.get_conversations, name)
+
+    async def save_persistence(self, user_data: Dict[int, Optional[str]],
+                               conversations: Dict[Tuple[str, str], Optional[str]]):
+        return await self._write(self.db.save_persistence, user_data, conversations)
+
+    async def get_stats(self) -> dict:
+        return await self._read(self.db.get_stats)
+
+    async def export(self, writer: Callable[[Iterator[tuple], str], int], path: str, status: Optional[str] = None,
+                     date_from: Optional[date] = None, date_to: Optional[date] = None) -> int:
+        """Передаёт строки Database.iter_export_rows в writer(rows, path) в потоке чтения."""
+        def export():
+            return writer(self.db.iter_export_rows(status, date_from, date_to), path)
+
+        return await self._read(export)
+
+    async def aclose(self):
+        """Фиксирует операции, ожидающие group commit, и закрывает соединения."""
+        while self._pending_writes or (self._group_commit_task is not None and not self._group_commit_task.done()):
+            if self._group_commit_task is None or self._group_commit_task.done():
+                self._group_commit_task = asyncio.get_running_loop().create_task(self._group_commit())
+            await self._group_commit_task
+        self.close()
+
+    def close(self):
+        """Дожидается завершения запросов в пулах потоков и закрывает соединения.
+
+        Операции, ещё ждущие group commit, не фиксируются — в цикле событий используйте aclose.
+        """
+        self._reader.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        self.db.close()
@@ -0,0 +1,53 @@
+# benchmarks/bench_admin_check.py
+# Путь callback-кнопки админа: проверка прав через SQL-запрос в пуле потоков против множества в памяти.
+# Запуск из корня репозитория: python benchmarks/bench_admin_check.py
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from async_database import AsyncDatabase
+
+ADMINS = 50
+CALLS = 20000
+
+
+class QueryAdminDatabase(AsyncDatabase):
+    """Прежнее поведение: SELECT к таблице admins на каждую проверку."""
+
+    def _query_is_admin(self, telegram_id: int) -> bool:
+        with self.db._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM admins WHERE telegram_id = ?', (telegram_id,))
+            return cursor.fetchone() is not None
+
+    async def is_admin(self, telegram_id: int) -> bool:
+        return await self._read(self._query_is_admin, telegram_id)
+
+
+async def measure(db: AsyncDatabase) -> float:
+    started = time.perf_counter()
+    for i in range(CALLS):
+        await db.is_admin(i % (ADMINS * 2))
+    return (time.perf_counter() - started) / CALLS * 1e6
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Database(os.path.join(tmp, 'bench.db'))
+        for i in range(ADMINS):
+            base.add_admin(i, f'admin{i}')
+
+        before = await measure(QueryAdminDatabase(base))
+        after = await measure(AsyncDatabase(base))
+        base.close()
+
+    print(f"is_admin: до {before:.1f} мкс/вызов, после {after:.2f} мкс/вызов ({before / after:.0f}x)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+# benchmarks/bench_connections.py
+# Сравнение: новое соединение sqlite3.connect на каждый вызов против долгоживущего соединения Database.
+# Запуск из корня репозитория: python benchmarks/bench_connections.py
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+TEAMS = 500
+CALLS = 5000
+
+
+class PerCallDatabase(Database):
+    """Прежнее поведение: новое соединение на каждый вызов метода."""
+
+    def _connection(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_file)
+
+    def close(self):
+        pass
+
+
+def is_admin_query(db: Database, telegram_id: int) -> bool:
+    """Прежний is_admin с запросом к таблице admins. Database.is_admin теперь проверяет список
+    в памяти и соединение не использует, поэтому для сравнения соединений берём сам запрос."""
+    cursor = db._connection().execute('SELECT 1 FROM admins WHERE telegram_id = ?', (telegram_id,))
+    return cursor.fetchone() is not None
+
+
+def fill(db: Database):
+    for i in range(TEAMS):
+        players = [
+            {'nickname': f'p{i}_{j}', 'username': f'user{i}_{j}', 'telegram_id': i * 10 + j, 'is_captain': j == 0}
+            for j in range(5)
+        ]
+        db.register_team(f'Team {i}', players, f'@captain{i}')
+    db.add_admin(1, 'admin')
+
+
+def run(db: Database) -> dict:
+    results = {}
+    calls = {
+        'is_admin (SQL)': lambda i: is_admin_query(db, i % 3),
+        'team_name_exists': lambda i: db.team_name_exists(f'team {i % TEAMS}'),
+        'get_team_by_telegram_id': lambda i: db.get_team_by_telegram_id((i % TEAMS) * 10),
+    }
+    for name, call in calls.items():
+        started = time.perf_counter()
+        for i in range(CALLS):
+            call(i)
+        results[name] = CALLS / (time.perf_counter() - started)
+    return results
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        pooled = Database(db_file)
+        fill(pooled)
+
+        before = run(PerCallDatabase(db_file))
+        after = run(pooled)
+        pooled.close()
+
+    print(f"{'метод':<26}{'до, вызовов/с':>16}{'после, вызовов/с':>19}{'ускорение':>12}")
+    for name in before:
+        print(f"{name:<26}{before[name]:>16.0f}{after[name]:>19.0f}{after[name] / before[name]:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/bench_export.py
+# Выгрузка 100k игроков в CSV: пиковая память Python не должна зависеть от числа строк.
+# Запуск из корня репозитория: python benchmarks/bench_export.py
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from export import write_csv
+
+PLAYERS = 100_000
+TEAM_SIZE = 5
+# Бюджет пиковой памяти на выгрузку, байт
+MEMORY_BUDGET = 4 * 1024 * 1024
+
+
+def fill(db: Database):
+    teams = PLAYERS // TEAM_SIZE
+    with db._connection() as conn:
+        conn.executemany(
+            "INSERT INTO teams (id, team_name, captain_contact, registration_date, status) VALUES (?, ?, ?, ?, ?)",
+            (
+                (i, f'Team {i}', f'@captain{i}', f'2024-01-{i % 28 + 1:02d}T12:00:00', 'approved' if i % 2 else 'pending')
+                for i in range(1, teams + 1)
+            )
+        )
+        conn.executemany(
+            "INSERT INTO players (team_id, nickname, telegram_username, telegram_id, is_captain) VALUES (?, ?, ?, ?, ?)",
+            (
+                (i // TEAM_SIZE + 1, f'Игрок {i}', f'user{i}', 1_000_000 + i, i % TEAM_SIZE == 0)
+                for i in range(PLAYERS)
+            )
+        )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        fill(db)
+        path = os.path.join(tmp, 'export.csv')
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        count = write_csv(db.iter_export_rows(), path)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        size = os.path.getsize(path)
+        db.close()
+
+    assert count == PLAYERS, count
+    print(f"Выгрузка {count} строк: {elapsed:.2f} с, файл {size / 1024 / 1024:.1f} МиБ, "
+          f"пик памяти {peak / 1024:.0f} КиБ (бюджет {MEMORY_BUDGET / 1024:.0f} КиБ)")
+    assert peak < MEMORY_BUDGET, "Выгрузка превысила бюджет памяти"
+
+
+if __name__ == '__main__':
+    main()
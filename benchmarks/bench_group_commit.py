@@ -0,0 +1,56 @@
+# benchmarks/bench_group_commit.py
+# 500 одновременных регистраций: транзакция на каждую команду против group commit.
+# Запуск из корня репозитория: python benchmarks/bench_group_commit.py
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from async_database import AsyncDatabase
+
+REGISTRATIONS = 500
+PLAYERS = 6
+
+
+def roster(i: int):
+    return [
+        {'nickname': f'p{i}_{j}', 'username': f'user{i}_{j}', 'telegram_id': i * 10 + j, 'is_captain': j == 0}
+        for j in range(PLAYERS)
+    ]
+
+
+async def per_transaction(db: AsyncDatabase, i: int) -> int:
+    # Прежний путь: отдельная транзакция и фиксация на каждую команду
+    return await db._write(db.db.register_team, f'Team {i}', roster(i), f'@captain{i}')
+
+
+async def grouped(db: AsyncDatabase, i: int) -> int:
+    return await db.register_team(f'Team {i}', roster(i), f'@captain{i}')
+
+
+async def measure(register) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabase(Database(os.path.join(tmp, 'bench.db')))
+        # synchronous = FULL: каждая фиксация ждёт fsync, как на реальном диске под нагрузкой
+        await db._write(lambda: db.db._connection().execute('PRAGMA synchronous = FULL'))
+        started = time.perf_counter()
+        team_ids = await asyncio.gather(*(register(db, i) for i in range(REGISTRATIONS)))
+        elapsed = time.perf_counter() - started
+        assert len(set(team_ids)) == REGISTRATIONS
+        db.close()
+    return REGISTRATIONS / elapsed
+
+
+async def main():
+    before = await measure(per_transaction)
+    after = await measure(grouped)
+    print(f"{REGISTRATIONS} одновременных регистраций: "
+          f"до {before:.0f} рег/с, после {after:.0f} рег/с ({after / before:.1f}x)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
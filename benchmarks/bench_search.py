@@ -0,0 +1,64 @@
+# benchmarks/bench_search.py
+# Поиск /find по 20k командам и 100k игрокам: точное совпадение, префикс, опечатка.
+# Запуск из корня репозитория: python benchmarks/bench_search.py
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+TEAMS = 20_000
+TEAM_SIZE = 5
+REPEATS = 50
+
+WORDS = ["Dragon", "Shadow", "Storm", "Phoenix", "Wolf", "Titan", "Falcon", "Viper", "Raven", "Ghost",
+         "Nova", "Blaze", "Frost", "Cobra", "Hydra", "Spectre", "Onyx", "Vortex", "Zenith", "Apex"]
+
+
+def fill(db: Database):
+    rnd = random.Random(1)
+    teams = [(f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {i}", f"@captain{i}") for i in range(TEAMS)]
+    with db._connection() as conn:
+        for i, (name, contact) in enumerate(teams, start=1):
+            conn.execute(
+                "INSERT INTO teams (id, team_name, captain_contact, registration_date) VALUES (?, ?, ?, '2024-01-01')",
+                (i, name, contact)
+            )
+        conn.executemany(
+            "INSERT INTO players (team_id, nickname, telegram_username, telegram_id, is_captain) VALUES (?, ?, ?, ?, ?)",
+            (
+                (i // TEAM_SIZE + 1, f"{rnd.choice(WORDS)}Slayer{i}", f"player_{i}", 1_000_000 + i, i % TEAM_SIZE == 0)
+                for i in range(TEAMS * TEAM_SIZE)
+            )
+        )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        fill(db)
+        queries = {
+            "подстрока": "Phoenix Storm",
+            "префикс": "player_4242",
+            "username с @": "@player_77777",
+            "опечатка": "Phonix Strom",
+            "опечатка в username": "playr_4242",
+            "короткий": "Ap",
+        }
+        for label, query in queries.items():
+            results = db.search_teams(query)
+            started = time.perf_counter()
+            for _ in range(REPEATS):
+                db.search_teams(query)
+            elapsed = (time.perf_counter() - started) / REPEATS
+            top = results[0]['team_name'] if results else '—'
+            print(f"{label:<14} {query!r:<18} {elapsed * 1000:7.2f} мс, найдено {len(results)}, первая: {top}")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
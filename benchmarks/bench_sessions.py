@@ -0,0 +1,99 @@
+# benchmarks/bench_sessions.py
+# 100k брошенных регистраций: память user_data в прежнем формате (словари) и в RegistrationState,
+# размер записи в tournament.db и время прохода RegistrationSweeper, который их сбрасывает.
+# Запуск из корня репозитория: python benchmarks/bench_sessions.py
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.ext import ConversationHandler
+
+from persistence import _encode
+from registration_state import REGISTRATION_KEY, RegistrationState, RegistrationSweeper
+
+SESSIONS = 100_000
+TEAM_SIZE = 5
+# Состояние диалога, на котором пользователь бросил регистрацию (SUBSCRIPTION_CHECK_RESULT)
+ABANDONED_STATE = 4
+
+
+class FakeApplication:
+    """Ровно то, что RegistrationSweeper использует из Application."""
+
+    def __init__(self, user_data: dict):
+        self.user_data = user_data
+        self.updated = set()
+
+    def mark_data_for_update_persistence(self, user_ids):
+        self.updated.add(user_ids)
+
+    def drop_user_data(self, user_id: int):
+        self.user_data.pop(user_id, None)
+        self.updated.add(user_id)
+
+
+def players(i: int) -> list:
+    return [
+        {'nickname': f'Игрок {i}_{j}', 'username': f'user{i}_{j}', 'telegram_id': 1_000_000 + i * TEAM_SIZE + j,
+         'is_captain': j == 0}
+        for j in range(TEAM_SIZE)
+    ]
+
+
+def legacy_session(i: int) -> dict:
+    """user_data прежней версии диалога после проверки подписки."""
+    return {
+        'team_name': f'Team {i}',
+        'captain_nickname': f'Игрок {i}_0',
+        'players_data': players(i),
+        'subscription_message': "✅ Все игроки из списка подписаны на канал @m5cup!",
+    }
+
+
+def compact_session(i: int) -> dict:
+    state = RegistrationState(f'Team {i}', f'Игрок {i}_0', updated_at=0.0)
+    state.set_players(players(i))
+    return {REGISTRATION_KEY: state}
+
+
+def measure(make_session) -> int:
+    tracemalloc.start()
+    sessions = {i: make_session(i) for i in range(SESSIONS)}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+    return size
+
+
+def main():
+    legacy = measure(legacy_session)
+    compact = measure(compact_session)
+    print(f"{SESSIONS} сессий в памяти: словари {legacy / 1024 / 1024:.1f} МиБ, "
+          f"RegistrationState {compact / 1024 / 1024:.1f} МиБ ({legacy / compact:.1f}x)")
+    print(f"Запись user_data в tournament.db: словари {len(_encode(legacy_session(0)).encode())} Б, "
+          f"RegistrationState {len(_encode(compact_session(0)).encode())} Б")
+
+    conversation = ConversationHandler(entry_points=[], states={}, fallbacks=[])
+    conversation._conversations.update(((i, i), ABANDONED_STATE) for i in range(SESSIONS))
+    application = FakeApplication({i: compact_session(i) for i in range(SESSIONS)})
+    sweeper = RegistrationSweeper(conversation, reply_markup=None)
+
+    # Все регистрации активны, сбрасывать нечего; первый проход ещё ищет ключи прежней версии
+    for name in ("Первый проход", "Обычный проход"):
+        started = time.perf_counter()
+        assert not sweeper.evict_expired(application, 0.0)
+        print(f"{name} по {SESSIONS} активным регистрациям: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    started = time.perf_counter()
+    expired = sweeper.evict_expired(application, time.time())
+    elapsed = time.perf_counter() - started
+
+    assert len(expired) == SESSIONS and not application.user_data and not conversation._conversations
+    print(f"Сброс {len(expired)} брошенных регистраций: {elapsed * 1000:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_team_status.py
+# «Проверить статус регистрации»: прежние три запроса на новом соединении против одного запроса
+# и против кэша AsyncDatabase.
+# Запуск из корня репозитория: python benchmarks/bench_team_status.py
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from async_database import AsyncDatabase
+from team_cache import TeamCache
+
+TEAMS = 2000
+TEAM_SIZE = 5
+CALLS = 20000
+# Доля нажатий от пользователей без команды
+UNREGISTERED_SHARE = 0.2
+
+
+def get_team_three_queries(db_file: str, telegram_id: int):
+    """Прежняя реализация: новое соединение и три последовательных запроса."""
+    conn = sqlite3.connect(db_file)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT team_id FROM players WHERE telegram_id = ?', (telegram_id,))
+        player = cursor.fetchone()
+        if not player:
+            return None
+        cursor.execute('''
+            SELECT t.id, t.team_name, t.status, t.registration_date, t.admin_comment
+            FROM teams t WHERE t.id = ?
+        ''', (player[0],))
+        team = cursor.fetchone()
+        if not team:
+            return None
+        cursor.execute('SELECT nickname, telegram_username, telegram_id FROM players WHERE team_id = ?', (player[0],))
+        return {'team_name': team[1], 'status': team[2], 'players': cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+def fill(db: Database):
+    with db._connection() as conn:
+        conn.executemany(
+            "INSERT INTO teams (id, team_name, captain_contact, registration_date) VALUES (?, ?, ?, '2024-01-01')",
+            ((i, f'Team {i}', f'@captain{i}') for i in range(1, TEAMS + 1))
+        )
+        conn.executemany(
+            "INSERT INTO players (team_id, nickname, telegram_username, telegram_id, is_captain) VALUES (?, ?, ?, ?, ?)",
+            ((i // TEAM_SIZE + 1, f'p{i}', f'user{i}', i, i % TEAM_SIZE == 0) for i in range(TEAMS * TEAM_SIZE))
+        )
+
+
+def user_ids():
+    rnd = random.Random(1)
+    # Как и в жизни, кнопку чаще нажимают одни и те же капитаны
+    hot = [rnd.randrange(TEAMS * TEAM_SIZE) for _ in range(TEAMS // 2)]
+    return [
+        TEAMS * TEAM_SIZE + rnd.randrange(10 ** 6) if rnd.random() < UNREGISTERED_SHARE else rnd.choice(hot)
+        for _ in range(CALLS)
+    ]
+
+
+async def main():
+    ids = user_ids()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        db = AsyncDatabase(Database(path))
+        fill(db.db)
+
+        started = time.perf_counter()
+        for telegram_id in ids:
+            get_team_three_queries(path, telegram_id)
+        before = (time.perf_counter() - started) / CALLS
+
+        # Один запрос через пул потоков AsyncDatabase, кэш отключён
+        cache, db.team_cache = db.team_cache, TeamCache(max_size=0)
+        started = time.perf_counter()
+        for telegram_id in ids:
+            await db.get_team_by_telegram_id(telegram_id)
+        single = (time.perf_counter() - started) / CALLS
+        db.team_cache = cache
+
+        started = time.perf_counter()
+        for telegram_id in ids:
+            await db.get_team_by_telegram_id(telegram_id)
+        cached = (time.perf_counter() - started) / CALLS
+        db.close()
+
+    print(f"Три запроса, новое соединение: {before * 1e6:.0f} мкс/вызов")
+    print(f"Один запрос, без кэша:         {single * 1e6:.0f} мкс/вызов ({before / single:.1f}x)")
+    print(f"Кэш AsyncDatabase:             {cached * 1e6:.1f} мкс/вызов ({before / cached:.0f}x), "
+          f"попаданий {db.team_cache.hit_rate:.0%}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
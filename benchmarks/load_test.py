@@ -0,0 +1,243 @@
+# benchmarks/load_test.py
+# Нагрузочный тест: тысячи капитанов одновременно проходят регистрацию в настоящем Application
+# из main.build_application. Bot API и Pyrogram заменены фальшивками с задаваемой задержкой
+# и долей ошибок, сеть не нужна.
+# Запуск из корня репозитория: python benchmarks/load_test.py --users 2000
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+BOT_ID = 1
+FAKE_TOKEN = f"{BOT_ID}:LOADTEST"
+
+# Шаги диалога регистрации: (название шага, текст сообщения пользователя)
+STEPS = ("start", "registration", "subscription", "team_name", "captain", "roster", "continue", "contacts")
+
+
+class FakeBotAPI(BaseRequest):
+    """Bot API в памяти процесса: отвечает на вызовы бота с задержкой latency и долей ошибок error_rate."""
+
+    def __init__(self, latency: float, error_rate: float, unsubscribed_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.unsubscribed_rate = unsubscribed_rate
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._message_id = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        if endpoint != "getMe" and random.random() < self.error_rate:
+            self.errors[endpoint] += 1
+            return 500, json.dumps({"ok": False, "error_code": 500, "description": "Internal Server Error"}).encode()
+        return 200, json.dumps({"ok": True, "result": self._result(endpoint, params)}).encode()
+
+    def _result(self, endpoint: str, params: dict):
+        if endpoint == "getMe":
+            return {"id": BOT_ID, "is_bot": True, "first_name": "LoadTest", "username": "load_test_bot"}
+        if endpoint == "getChatMember":
+            status = "left" if random.random() < self.unsubscribed_rate else "member"
+            return {"status": status, "user": {"id": int(params["user_id"]), "is_bot": False, "first_name": "Player"}}
+        if endpoint in ("sendMessage", "editMessageText", "sendDocument"):
+            self._message_id += 1
+            return {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return True
+
+
+class FakeResolver:
+    """Замена Pyrogram-клиента: get_users отвечает с задержкой и иногда падает."""
+
+    def __init__(self, latency: float, error_rate: float):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def get_users(self, username: str):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.error_rate:
+            self.errors += 1
+            raise ConnectionError("fake resolver error")
+        return SimpleNamespace(id=10_000_000 + hash(username) % 1_000_000_000)
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Captain", "username": f"cap{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def step_texts(user_id: int, roster: int) -> List[str]:
+    players = "\n".join(f"Player{user_id}_{j} – @p{user_id}_{j}" for j in range(roster))
+    return ["/start", "Регистрация", "Проверить подписку", f"Load Team {user_id}",
+            f"Captain{user_id}", players, "Продолжить", f"@cap{user_id}"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def histogram_quantile(series, q: float) -> float:
+    """Верхняя граница корзины гистограммы metrics.Histogram, в которую попадает квантиль q."""
+    target = q * series.count
+    cumulative = 0
+    for bound, count in zip(series.buckets, series.counts):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float("inf")
+
+
+async def run(args, main):
+    request = FakeBotAPI(args.api_latency, args.api_error_rate, args.unsubscribed_rate)
+    main.userbot = resolver = FakeResolver(args.resolver_latency, args.resolver_error_rate)
+    application = main.build_application(FAKE_TOKEN, request=request)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    timings: Dict[str, List[float]] = defaultdict(list)
+    update_ids = iter(range(1, 10 ** 9))
+
+    async def feed(user_id: int, text: str) -> float:
+        update = Update.de_json(make_update(next(update_ids), user_id, text), application.bot)
+        started = time.perf_counter()
+        # Тот же путь, что и у обновлений из getUpdates/вебхука, включая лимит concurrent_updates
+        await application.update_processor.process_update(update, application.process_update(update))
+        return time.perf_counter() - started
+
+    async def captain(user_id: int):
+        if args.ramp:
+            await asyncio.sleep(random.uniform(0, args.ramp))
+        for step, text in zip(STEPS, step_texts(user_id, args.roster)):
+            timings[step].append(await feed(user_id, text))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(captain(100_000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    stats = await main.db.get_stats()
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+    return timings, elapsed, stats, request, resolver
+
+
+def report(args, timings, elapsed, stats, request, resolver):
+    from metrics import DB_LATENCY, DB_ERRORS
+
+    print(f"Пользователей: {args.users}, состав: {args.roster} игроков, concurrent_updates: {args.concurrent_updates}")
+    print(f"Зарегистрировано команд: {stats['teams_total']} за {elapsed:.1f} с "
+          f"({stats['teams_total'] / elapsed:.0f} рег/с, {sum(map(len, timings.values())) / elapsed:.0f} обновлений/с)")
+
+    print(f"\n{'Шаг':<14}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for step in STEPS:
+        values = timings[step]
+        print(f"{step:<14}" + "".join(
+            f"{percentile(values, q) * 1000:>10.1f}" for q in (0.5, 0.95, 0.99, 1.0)
+        ))
+
+    print(f"\nSQLite (время с учётом очереди к потокам и group commit):")
+    print(f"{'Метод':<28}{'вызовов':>9}{'среднее, мс':>13}{'p95 ≤, мс':>11}{'ошибок':>8}")
+    for method, series in sorted(DB_LATENCY.series.items()):
+        errors = DB_ERRORS.series.get(method)
+        print(f"{method:<28}{series.count:>9}{series.sum / series.count * 1000:>13.2f}"
+              f"{histogram_quantile(series, 0.95) * 1000:>11.1f}{errors.value if errors else 0:>8}")
+    batches = DB_LATENCY.series.get("execute_batch")
+    grouped = sum(series.count for method, series in DB_LATENCY.series.items() if method.startswith("_"))
+    if batches:
+        print(f"Операций в одной транзакции group commit в среднем: {grouped / batches.count:.1f}")
+
+    print(f"\nBot API: {sum(request.calls.values())} вызовов, ошибок {sum(request.errors.values())}: "
+          + ", ".join(f"{endpoint} {count}" for endpoint, count in request.calls.most_common()))
+    print(f"Pyrogram get_users: {resolver.calls} вызовов, ошибок {resolver.errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест диалога регистрации")
+    parser.add_argument("--users", type=int, default=2000, help="сколько капитанов регистрируются одновременно")
+    parser.add_argument("--roster", type=int, default=4, help="игроков в составе, не считая капитана")
+    parser.add_argument("--ramp", type=float, default=0.0, help="разброс времени старта капитанов, секунд")
+    parser.add_argument("--concurrent-updates", type=int, default=256)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="задержка Bot API, секунд")
+    parser.add_argument("--api-error-rate", type=float, default=0.0)
+    parser.add_argument("--unsubscribed-rate", type=float, default=0.0, help="доля игроков без подписки на канал")
+    parser.add_argument("--resolver-latency", type=float, default=0.1, help="задержка Pyrogram get_users, секунд")
+    parser.add_argument("--resolver-error-rate", type=float, default=0.01)
+    parser.add_argument("--telegram-limits", action="store_true",
+                        help="оставить лимиты Telegram на исходящие сообщения (30/с на бота, 1/с на чат)")
+    parser.add_argument("--verbose", action="store_true", help="показывать логи бота")
+    args = parser.parse_args()
+
+    # Настройки модулей бота читаются из окружения при импорте, поэтому задаём их до импорта main
+    os.environ.update(API_ID=os.environ.get("API_ID", "1"), API_HASH=os.environ.get("API_HASH", "loadtest"),
+                      BOT_TOKEN=FAKE_TOKEN, METRICS_PORT="0", CONCURRENT_UPDATES=str(args.concurrent_updates))
+    if not args.telegram_limits:
+        os.environ.update(GLOBAL_MESSAGES_PER_SECOND="1000000", CHAT_MESSAGES_PER_SECOND="1000000",
+                          CHAT_BURST="1000000")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # main создаёт tournament.db в текущем каталоге — пусть это будет временная база
+        os.chdir(workdir)
+        import main as bot_main
+
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.CRITICAL)
+        results = asyncio.run(run(args, bot_main))
+        os.chdir(REPO_ROOT)
+    report(args, *results)
+
+
+if __name__ == '__main__':
+    main()
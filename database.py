@@ -1,84 +1,593 @@
 #database.py
 import sqlite3
-from datetime import datetime
-from typing import List, Tuple, Optional, Dict
+import threading
+import time
+from difflib import SequenceMatcher
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, List, Tuple, Optional, Dict, Iterator, FrozenSet
+
+# Настройки соединений SQLite
+STATEMENT_CACHE_SIZE = 128          # подготовленных запросов на соединение
+CACHE_SIZE_KIB = 16 * 1024          # кэш страниц, КиБ
+MMAP_SIZE = 64 * 1024 * 1024        # отображение файла БД в память, байт
+BUSY_TIMEOUT = 5.0                  # ожидание блокировки записи, секунд
+# Токенизатор FTS5 trigram (поиск команд) появился в SQLite 3.34
+MIN_SQLITE_VERSION = (3, 34, 0)
+
+# Размер страницы при постраничной выборке команд
+TEAMS_PAGE_SIZE = 100
+# Сколько id передавать в одном WHERE id IN (...): держимся ниже лимита параметров старых SQLite
+STATUS_UPDATE_CHUNK = 500
+# Поиск команд: сколько команд возвращать, сколько кандидатов проверять на опечатки,
+# сколько строк может совпасть с выбранными триграммами и с какой похожести (0..1)
+# кандидат считается совпадением
+SEARCH_LIMIT = 10
+FUZZY_CANDIDATES = 100
+FUZZY_MAX_DOCS = 5000
+FUZZY_MIN_SCORE = 0.7
+
+# Миграции схемы. Миграция с индексом N переводит базу с версии N на N + 1.
+# Уже выпущенные миграции не меняются — новые изменения добавляются в конец списка.
+MIGRATIONS: List[List[str]] = [
+    # 1: исходные таблицы
+    [
+        # Таблица команд
+        '''
+            CREATE TABLE IF NOT EXISTS teams (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                team_name TEXT NOT NULL,
+                captain_contact TEXT NOT NULL,
+                registration_date TIMESTAMP NOT NULL,
+                status TEXT DEFAULT 'pending',
+                admin_comment TEXT
+            )
+        ''',
+        # Таблица игроков
+        '''
+            CREATE TABLE IF NOT EXISTS players (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                team_id INTEGER,
+                nickname TEXT NOT NULL,
+                telegram_username TEXT NOT NULL,
+                telegram_id INTEGER,  -- Добавлено поле telegram_id
+                is_captain BOOLEAN DEFAULT 0,
+                FOREIGN KEY (team_id) REFERENCES teams (id)
+            )
+        ''',
+        # Таблица администраторов
+        '''
+            CREATE TABLE IF NOT EXISTS admins (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                telegram_id INTEGER UNIQUE NOT NULL,
+                username TEXT,
+                added_date TIMESTAMP NOT NULL
+            )
+        ''',
+    ],
+    # 2: индексы для частых запросов
+    [
+        # Раньше название проверялось за несколько шагов до записи команды, поэтому в старых базах
+        # встречаются одинаковые без учёта регистра названия: более поздним добавляем « (id)».
+        # Базы, где миграция уже применена, дубликатов не содержат, так что правка для них безопасна
+        '''
+            UPDATE teams SET team_name = team_name || ' (' || id || ')'
+            WHERE EXISTS (
+                SELECT 1 FROM teams earlier
+                WHERE earlier.team_name = teams.team_name COLLATE NOCASE AND earlier.id < teams.id
+            )
+        ''',
+        # Уникальность названия без учёта регистра (team_name_exists, get_team_status)
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_teams_team_name ON teams (team_name COLLATE NOCASE)',
+        # Поиск команды игрока (get_team_by_telegram_id)
+        'CREATE INDEX IF NOT EXISTS idx_players_telegram_id ON players (telegram_id)',
+        # Состав команды
+        'CREATE INDEX IF NOT EXISTS idx_players_team_id ON players (team_id)',
+        # Списки команд по статусу в порядке регистрации
+        'CREATE INDEX IF NOT EXISTS idx_teams_status_date ON teams (status, registration_date)',
+    ],
+    # 3: постраничный список всех команд без фильтра по статусу
+    [
+        'CREATE INDEX IF NOT EXISTS idx_teams_registration_date ON teams (registration_date)',
+    ],
+    # 4: кэш соответствий username → telegram_id
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS username_cache (
+                username TEXT PRIMARY KEY,  -- в нижнем регистре
+                telegram_id INTEGER,        -- NULL: пользователь не найден
+                resolved_at REAL NOT NULL   -- unix-время проверки
+            )
+        ''',
+    ],
+    # 5: локальный индекс подписчиков канала
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS channel_members (
+                user_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,       -- member, administrator, creator, left, kicked, ...
+                updated_at REAL NOT NULL    -- unix-время последнего подтверждения
+            )
+        ''',
+    ],
+    # 6: состояние диалогов (SQLitePersistence)
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS conversations (
+                name TEXT NOT NULL,         -- имя ConversationHandler
+                key TEXT NOT NULL,          -- ключ диалога в JSON
+                state TEXT NOT NULL,        -- состояние в JSON
+                PRIMARY KEY (name, key)
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL          -- context.user_data в JSON
+            )
+        ''',
+    ],
+    # 7: счётчики статистики, поддерживаемые триггерами
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                key TEXT PRIMARY KEY,       -- players, teams_<статус>
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS registrations_by_hour (
+                hour TEXT PRIMARY KEY,      -- YYYY-MM-DD HH:00 (UTC)
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        ''',
+        # Заполняем счётчики по уже существующим данным
+        '''
+            INSERT OR REPLACE INTO stats_counters (key, value)
+            SELECT 'teams_' || status, COUNT(*) FROM teams GROUP BY status
+        ''',
+        '''
+            INSERT OR REPLACE INTO stats_counters (key, value)
+            SELECT 'players', COUNT(*) FROM players
+        ''',
+        '''
+            INSERT OR REPLACE INTO registrations_by_hour (hour, count)
+            SELECT strftime('%Y-%m-%d %H:00', registration_date), COUNT(*) FROM teams GROUP BY 1
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_stats_team_insert AFTER INSERT ON teams
+            BEGIN
+                INSERT INTO stats_counters (key, value) VALUES ('teams_' || NEW.status, 1)
+                ON CONFLICT (key) DO UPDATE SET value = value + 1;
+                INSERT INTO registrations_by_hour (hour, count)
+                VALUES (strftime('%Y-%m-%d %H:00', NEW.registration_date), 1)
+                ON CONFLICT (hour) DO UPDATE SET count = count + 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_stats_team_status AFTER UPDATE OF status ON teams
+            WHEN OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE stats_counters SET value = value - 1 WHERE key = 'teams_' || OLD.status;
+                INSERT INTO stats_counters (key, value) VALUES ('teams_' || NEW.status, 1)
+                ON CONFLICT (key) DO UPDATE SET value = value + 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_stats_team_delete AFTER DELETE ON teams
+            BEGIN
+                UPDATE stats_counters SET value = value - 1 WHERE key = 'teams_' || OLD.status;
+                UPDATE registrations_by_hour SET count = count - 1
+                WHERE hour = strftime('%Y-%m-%d %H:00', OLD.registration_date);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_stats_player_insert AFTER INSERT ON players
+            BEGIN
+                INSERT INTO stats_counters (key, value) VALUES ('players', 1)
+                ON CONFLICT (key) DO UPDATE SET value = value + 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_stats_player_delete AFTER DELETE ON players
+            BEGIN
+                UPDATE stats_counters SET value = value - 1 WHERE key = 'players';
+            END
+        ''',
+    ],
+    # 8: полнотекстовый поиск (FTS5, триграммы) по командам и игрокам
+    [
+        '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS teams_fts USING fts5(
+                team_name, captain_contact,
+                content='teams', content_rowid='id', tokenize='trigram'
+            )
+        ''',
+        '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS players_fts USING fts5(
+                nickname, telegram_username,
+                content='players', content_rowid='id', tokenize='trigram'
+            )
+        ''',
+        # Частоты триграмм: для поиска с опечатками берутся только достаточно редкие
+        "CREATE VIRTUAL TABLE IF NOT EXISTS teams_fts_vocab USING fts5vocab(teams_fts, 'row')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS players_fts_vocab USING fts5vocab(players_fts, 'row')",
+        # Индексируем уже существующие данные
+        "INSERT INTO teams_fts (teams_fts) VALUES ('rebuild')",
+        "INSERT INTO players_fts (players_fts) VALUES ('rebuild')",
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_fts_team_insert AFTER INSERT ON teams
+            BEGIN
+                INSERT INTO teams_fts (rowid, team_name, captain_contact)
+                VALUES (NEW.id, NEW.team_name, NEW.captain_contact);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_fts_team_update AFTER UPDATE OF team_name, captain_contact ON teams
+            BEGIN
+                INSERT INTO teams_fts (teams_fts, rowid, team_name, captain_contact)
+                VALUES ('delete', OLD.id, OLD.team_name, OLD.captain_contact);
+                INSERT INTO teams_fts (rowid, team_name, captain_contact)
+                VALUES (NEW.id, NEW.team_name, NEW.captain_contact);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_fts_team_delete AFTER DELETE ON teams
+            BEGIN
+                INSERT INTO teams_fts (teams_fts, rowid, team_name, captain_contact)
+                VALUES ('delete', OLD.id, OLD.team_name, OLD.captain_contact);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_fts_player_insert AFTER INSERT ON players
+            BEGIN
+                INSERT INTO players_fts (rowid, nickname, telegram_username)
+                VALUES (NEW.id, NEW.nickname, NEW.telegram_username);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_fts_player_update AFTER UPDATE OF nickname, telegram_username ON players
+            BEGIN
+                INSERT INTO players_fts (players_fts, rowid, nickname, telegram_username)
+                VALUES ('delete', OLD.id, OLD.nickname, OLD.telegram_username);
+                INSERT INTO players_fts (rowid, nickname, telegram_username)
+                VALUES (NEW.id, NEW.nickname, NEW.telegram_username);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_fts_player_delete AFTER DELETE ON players
+            BEGIN
+                INSERT INTO players_fts (players_fts, rowid, nickname, telegram_username)
+                VALUES ('delete', OLD.id, OLD.nickname, OLD.telegram_username);
+            END
+        ''',
+    ],
+    # 9: поиск игрока по username без учёта регистра (проверка дублей между командами)
+    [
+        'CREATE INDEX IF NOT EXISTS idx_players_telegram_username ON players (telegram_username COLLATE NOCASE)',
+    ],
+    # 10: результаты фоновой перепроверки подписки игроков и контрольные точки фоновых задач
+    [
+        'ALTER TABLE players ADD COLUMN last_verified_at REAL',
+        # subscribed, not_subscribed или not_found; время последнего изменения результата
+        'ALTER TABLE players ADD COLUMN last_verification TEXT',
+        'ALTER TABLE players ADD COLUMN verification_changed_at REAL',
+        '''
+            CREATE TABLE IF NOT EXISTS job_checkpoints (
+                name TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,  -- последний обработанный id
+                cycle_started_at REAL NOT NULL
+            )
+        ''',
+    ],
+    # 11: очередь уведомлений игрокам и рассылок администраторов
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                created_by INTEGER,
+                created_at REAL NOT NULL,
+                recipients INTEGER NOT NULL DEFAULT 0
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,             -- team_status или broadcast
+                team_id INTEGER,
+                status TEXT,                    -- новый статус команды для team_status
+                broadcast_id INTEGER,
+                state TEXT NOT NULL DEFAULT 'pending',  -- pending, sending, sent, failed
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_notifications_state ON notifications (state, id)',
+        'CREATE INDEX IF NOT EXISTS idx_notifications_broadcast ON notifications (broadcast_id, state)',
+        # Уведомление игрокам ставится в очередь в той же транзакции, что и смена статуса команды
+        '''
+            CREATE TRIGGER IF NOT EXISTS trg_notify_team_status AFTER UPDATE OF status ON teams
+            WHEN OLD.status IS NOT NEW.status AND NEW.status IN ('approved', 'rejected')
+            BEGIN
+                INSERT INTO notifications (chat_id, kind, team_id, status, created_at)
+                SELECT DISTINCT telegram_id, 'team_status', NEW.id, NEW.status,
+                       (julianday('now') - 2440587.5) * 86400.0
+                FROM players
+                WHERE team_id = NEW.id AND telegram_id IS NOT NULL;
+            END
+        ''',
+    ],
+]
+
+def _similarity(matcher: SequenceMatcher, text: str) -> float:
+    """Похожесть запроса (matcher.b) на строку или на любое её слово, без учёта регистра.
+
+    Дешёвые верхние оценки quick_ratio отсекают варианты, которые не могут набрать
+    FUZZY_MIN_SCORE или превзойти уже найденный, до точного ratio.
+    """
+    best = FUZZY_MIN_SCORE - 0.001
+    text = text.lower()
+    for part in [text, *text.split()]:
+        matcher.set_seq1(part)
+        if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+            best = max(best, matcher.ratio())
+    return best if best >= FUZZY_MIN_SCORE else 0.0
+
 
 class Database:
     def __init__(self, db_file: str = "tournament.db"):
         self.db_file = db_file
+        # Одно долгоживущее соединение на поток вместо sqlite3.connect на каждый вызов
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._admins: FrozenSet[int] = frozenset()
         self.init_db()
+        self.load_admins()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Возвращает соединение текущего потока, открывая его при первом обращении.
+
+        Соединение используется как контекстный менеджер: `with self._connection() as conn`
+        фиксирует транзакцию при успехе и откатывает её при исключении, но не закрывает соединение.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_file,
+                timeout=BUSY_TIMEOUT,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KIB}')
+            conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+            conn.execute('PRAGMA temp_store = MEMORY')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Закрывает все открытые соединения (вызывается при остановке приложения)."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Соединение уже закрыто
+                pass
 
     def init_db(self):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            
-            # Таблица команд
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS teams (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    team_name TEXT NOT NULL,
-                    captain_contact TEXT NOT NULL,
-                    registration_date TIMESTAMP NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    admin_comment TEXT
-                )
-            ''')
-            
-            # Таблица игроков
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS players (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    team_id INTEGER,
-                    nickname TEXT NOT NULL,
-                    telegram_username TEXT NOT NULL,
-                    telegram_id INTEGER,  -- Добавлено поле telegram_id
-                    is_captain BOOLEAN DEFAULT 0,
-                    FOREIGN KEY (team_id) REFERENCES teams (id)
-                )
-            ''')
-            
-            # Таблица администраторов
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS admins (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER UNIQUE NOT NULL,
-                    username TEXT,
-                    added_date TIMESTAMP NOT NULL
-                )
-            ''')
-            
-            conn.commit()
+        """Приводит схему к актуальной версии, применяя недостающие миграции.
+
+        Номер применённой миграции хранится в PRAGMA user_version, поэтому
+        существующие файлы tournament.db обновляются на месте.
+        """
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))}+ is required for FTS5 trigram search, "
+                f"found {sqlite3.sqlite_version}"
+            )
+        conn = self._connection()
+        while True:
+            with conn:
+                # BEGIN IMMEDIATE не даёт двум процессам применить одну миграцию дважды
+                conn.execute('BEGIN IMMEDIATE')
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    return
+                for statement in MIGRATIONS[version]:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
 
     def register_team(self, team_name: str, players: List[Dict[str, str]], captain_contact: str) -> int:
-        with sqlite3.connect(self.db_file) as conn:
+        with self._connection() as conn:
+            return self._insert_team(conn.cursor(), team_name, players, captain_contact)
+
+    def _insert_team(self, cursor: sqlite3.Cursor, team_name: str, players: List[Dict[str, str]],
+                     captain_contact: str) -> int:
+        # Добавляем команду
+        cursor.execute('''
+            INSERT INTO teams (team_name, captain_contact, registration_date)
+            VALUES (?, ?, ?)
+        ''', (team_name, captain_contact, datetime.utcnow()))
+
+        team_id = cursor.lastrowid
+
+        # Добавляем игроков одним executemany
+        cursor.executemany('''
+            INSERT INTO players (team_id, nickname, telegram_username, telegram_id, is_captain)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (team_id, player['nickname'], player['username'], player['telegram_id'], player['is_captain'])
+            for player in players
+        ])
+        return team_id
+
+    def execute_batch(self, operations: List[Tuple[Callable, tuple]]) -> List[Any]:
+        """Выполняет несколько операций записи в одной транзакции (group commit).
+
+        operations — пары (метод вида _insert_team(cursor, ...), аргументы). Каждая операция
+        выполняется в своей точке сохранения: ошибка откатывает только её, а в списке
+        результатов на её месте оказывается исключение.
+        """
+        results = []
+        with self._connection() as conn:
             cursor = conn.cursor()
-            
-            # Добавляем команду
-            cursor.execute('''
-                INSERT INTO teams (team_name, captain_contact, registration_date)
-                VALUES (?, ?, ?)
-            ''', (team_name, captain_contact, datetime.utcnow()))
-            
-            team_id = cursor.lastrowid
-            
-            # Добавляем игроков
-            for player in players:
-                cursor.execute('''
-                    INSERT INTO players (team_id, nickname, telegram_username, telegram_id, is_captain)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (team_id, player['nickname'], player['username'], player['telegram_id'], player['is_captain']))
-            
-            conn.commit()
-            return team_id
+            cursor.execute('BEGIN IMMEDIATE')
+            for operation, args in operations:
+                cursor.execute('SAVEPOINT batch_operation')
+                try:
+                    results.append(operation(cursor, *args))
+                except Exception as e:
+                    # Любая ошибка операции (в том числе KeyError из неполных данных) не должна
+                    # откатывать соседние операции транзакции
+                    cursor.execute('ROLLBACK TO batch_operation')
+                    results.append(e)
+                cursor.execute('RELEASE batch_operation')
+        return results
+
+    def search_teams(self, query: str, limit: int = SEARCH_LIMIT) -> List[dict]:
+        """Поиск команд по названию, контакту капитана, никнеймам и username игроков.
+
+        Сначала ищется подстрока (а значит и префикс) по триграммному индексу FTS5; если
+        совпадений нет, ищутся похожие варианты — кандидаты с общими триграммами,
+        отсеянные по похожести на запрос. Запросы короче трёх символов ищутся по префиксу.
+        Возвращает команды в порядке релевантности; в 'matches' — совпавшие игроки.
+        """
+        query = query.strip().lstrip('@').lower()
+        if not query:
+            return []
+        conn = self._connection()
+
+        # (id команды, совпавший игрок или None) в порядке релевантности
+        hits: List[Tuple[int, Optional[str]]] = []
+        if len(query) < 3:
+            pattern = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            hits += conn.execute('''
+                SELECT id, NULL FROM teams WHERE team_name LIKE ? ESCAPE '\\' LIMIT ?
+            ''', (pattern, limit)).fetchall()
+            hits += conn.execute('''
+                SELECT team_id, nickname || ' – @' || telegram_username FROM players
+                WHERE nickname LIKE ? ESCAPE '\\' OR telegram_username LIKE ? ESCAPE '\\'
+                LIMIT ?
+            ''', (pattern, pattern, limit)).fetchall()
+        else:
+            # Фраза в кавычках — поиск подстроки
+            hits += self._fts_hits(conn, '"' + query.replace('"', '""') + '"', limit)
+            if not hits:
+                hits += self._fuzzy_hits(conn, query)
+
+        team_ids: List[int] = []
+        matches: Dict[int, List[str]] = {}
+        for team_id, player in hits:
+            if team_id not in matches:
+                if len(team_ids) == limit:
+                    continue
+                team_ids.append(team_id)
+                matches[team_id] = []
+            if player and player not in matches[team_id]:
+                matches[team_id].append(player)
+        if not team_ids:
+            return []
+
+        rows = conn.execute(f'''
+            SELECT id, team_name, status, captain_contact FROM teams
+            WHERE id IN ({', '.join('?' * len(team_ids))})
+        ''', team_ids).fetchall()
+        teams = {row[0]: row for row in rows}
+        return [
+            {
+                'id': team_id,
+                'team_name': teams[team_id][1],
+                'status': teams[team_id][2],
+                'captain_contact': teams[team_id][3],
+                'matches': matches[team_id],
+            }
+            for team_id in team_ids if team_id in teams
+        ]
+
+    def _fts_hits(self, conn: sqlite3.Connection, match: str, limit: int) -> List[Tuple[int, Optional[str]]]:
+        hits = conn.execute('''
+            SELECT rowid, NULL FROM teams_fts WHERE teams_fts MATCH ? ORDER BY rank LIMIT ?
+        ''', (match, limit)).fetchall()
+        hits += conn.execute('''
+            SELECT p.team_id, p.nickname || ' – @' || p.telegram_username
+            FROM players_fts f
+            JOIN players p ON p.id = f.rowid
+            WHERE players_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (match, limit)).fetchall()
+        return hits
+
+    def _fuzzy_match(self, conn: sqlite3.Connection, vocab: str, query: str) -> Optional[str]:
+        """MATCH-выражение «любая из триграмм запроса», без самых частых триграмм.
+
+        Частые триграммы (например, «pla» в player_*) совпадают с большей частью таблицы,
+        и ранжирование такого множества заняло бы сотни миллисекунд; кандидатов с опечаткой
+        достаточно искать по редким. Триграммы берутся от редких к частым, пока ожидаемое
+        число кандидатов не превысит FUZZY_MAX_DOCS.
+        """
+        trigrams = list({query[i:i + 3] for i in range(len(query) - 2)})
+        counts = dict(conn.execute(
+            f"SELECT term, doc FROM {vocab} WHERE term IN ({', '.join('?' * len(trigrams))})", trigrams
+        ))
+        selected, total = [], 0
+        for trigram in sorted(counts, key=counts.get):
+            if selected and total + counts[trigram] > FUZZY_MAX_DOCS:
+                break
+            selected.append(trigram)
+            total += counts[trigram]
+        if not selected:
+            return None
+        return ' OR '.join('"' + trigram.replace('"', '""') + '"' for trigram in selected)
+
+    def _fuzzy_hits(self, conn: sqlite3.Connection, query: str) -> List[Tuple[int, Optional[str]]]:
+        """Варианты с опечатками: кандидаты с общими триграммами, отсеянные по похожести на запрос."""
+        # SequenceMatcher кэширует разбор второй последовательности — запрос разбирается один раз
+        matcher = SequenceMatcher(None, b=query, autojunk=False)
+        scored = []
+        match = self._fuzzy_match(conn, 'teams_fts_vocab', query)
+        if match:
+            for team_id, name, contact in conn.execute('''
+                SELECT t.id, t.team_name, t.captain_contact
+                FROM teams_fts f
+                JOIN teams t ON t.id = f.rowid
+                WHERE teams_fts MATCH ?
+                ORDER BY f.rank
+                LIMIT ?
+            ''', (match, FUZZY_CANDIDATES)):
+                scored.append((max(_similarity(matcher, name), _similarity(matcher, contact)), team_id, None))
+        match = self._fuzzy_match(conn, 'players_fts_vocab', query)
+        if match:
+            for team_id, nickname, username in conn.execute('''
+                SELECT p.team_id, p.nickname, p.telegram_username
+                FROM players_fts f
+                JOIN players p ON p.id = f.rowid
+                WHERE players_fts MATCH ?
+                ORDER BY f.rank
+                LIMIT ?
+            ''', (match, FUZZY_CANDIDATES)):
+                score = max(_similarity(matcher, nickname), _similarity(matcher, username))
+                scored.append((score, team_id, f"{nickname} – @{username}"))
+        scored.sort(key=lambda hit: hit[0], reverse=True)
+        return [(team_id, player) for score, team_id, player in scored if score >= FUZZY_MIN_SCORE]
 
     def get_team_status(self, team_name: str) -> Optional[dict]:
-        with sqlite3.connect(self.db_file) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
                 SELECT t.id, t.team_name, t.status, t.registration_date, t.admin_comment
                 FROM teams t
-                WHERE t.team_name = ?
+                WHERE t.team_name = ? COLLATE NOCASE
             ''', (team_name,))
             
             team = cursor.fetchone()
@@ -102,119 +611,521 @@ class Database:
             }
     
     def get_team_by_telegram_id(self, telegram_id: int) -> Optional[dict]:
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            
-            # Находим team_id по telegram_id игрока
-            cursor.execute('''
-                SELECT team_id FROM players WHERE telegram_id = ?
-            ''', (telegram_id,))
-            
-            player = cursor.fetchone()
-            if not player:
-                return None
-            
-            team_id = player[0]
-            
-            # Получаем информацию о команде по team_id
-            cursor.execute('''
-                SELECT t.id, t.team_name, t.status, t.registration_date, t.admin_comment
-                FROM teams t
-                WHERE t.id = ?
-            ''', (team_id,))
-            
-            team = cursor.fetchone()
-            if not team:
-                return None
-            
-            # Получаем информацию об игроках команды
-            cursor.execute('''
-                SELECT nickname, telegram_username, telegram_id
-                FROM players
-                WHERE team_id = ?
-            ''', (team_id,))
-            
-            players = cursor.fetchall()
-            
-            return {
-                'team_name': team[1],
-                'status': team[2],
-                'registration_date': team[3],
-                'admin_comment': team[4],
-                'players': players
-            }
+        # Команда игрока и её состав одним запросом: поиск по idx_players_telegram_id, состав по idx_players_team_id
+        rows = self._connection().execute('''
+            SELECT t.id, t.team_name, t.status, t.registration_date, t.admin_comment,
+                   p.nickname, p.telegram_username, p.telegram_id
+            FROM teams t
+            LEFT JOIN players p ON p.team_id = t.id
+            WHERE t.id = (SELECT team_id FROM players WHERE telegram_id = ? LIMIT 1)
+            ORDER BY p.id
+        ''', (telegram_id,)).fetchall()
+        if not rows:
+            return None
+
+        team = rows[0]
+        return {
+            'id': team[0],
+            'team_name': team[1],
+            'status': team[2],
+            'registration_date': team[3],
+            'admin_comment': team[4],
+            'players': [row[5:] for row in rows if row[5] is not None]
+        }
 
     def add_admin(self, telegram_id: int, username: str) -> bool:
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO admins (telegram_id, username, added_date)
                     VALUES (?, ?, ?)
                 ''', (telegram_id, username, datetime.utcnow()))
                 conn.commit()
+                self._admins = self._admins | {telegram_id}
                 return True
         except sqlite3.IntegrityError:
             return False
 
-    def is_admin(self, telegram_id: int) -> bool:
-        with sqlite3.connect(self.db_file) as conn:
+    def load_admins(self):
+        """Перечитывает список администраторов из базы в память."""
+        with self._connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT 1 FROM admins WHERE telegram_id = ?', (telegram_id,))
-            return cursor.fetchone() is not None
+            cursor.execute('SELECT telegram_id FROM admins')
+            # Множество заменяется целиком, поэтому читатели из других потоков не видят его частично обновлённым
+            self._admins = frozenset(row[0] for row in cursor)
+
+    def is_admin(self, telegram_id: int) -> bool:
+        # Проверка без обращения к базе; список обновляют add_admin и load_admins
+        return telegram_id in self._admins
+
+    def get_admin_ids(self) -> FrozenSet[int]:
+        return self._admins
 
     def update_team_status(self, team_id: int, status: str, comment: str = None) -> bool:
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            if comment:
-                cursor.execute('''
-                    UPDATE teams 
-                    SET status = ?, admin_comment = ?
-                    WHERE id = ?
-                ''', (status, comment, team_id))
-            else:
-                cursor.execute('''
-                    UPDATE teams 
-                    SET status = ?
-                    WHERE id = ?
-                ''', (status, team_id))
-            conn.commit()
-            return cursor.rowcount > 0
-        
+        with self._connection() as conn:
+            return self._set_team_status(conn.cursor(), team_id, status, comment) > 0
+
+    def _set_team_status(self, cursor: sqlite3.Cursor, team_id: int, status: str, comment: str = None) -> int:
+        if comment:
+            cursor.execute('''
+                UPDATE teams 
+                SET status = ?, admin_comment = ?
+                WHERE id = ?
+            ''', (status, comment, team_id))
+        else:
+            cursor.execute('''
+                UPDATE teams 
+                SET status = ?
+                WHERE id = ?
+            ''', (status, team_id))
+        return cursor.rowcount
+
+    def update_team_status_many(self, team_ids: List[int], status: str) -> int:
+        """Меняет статус сразу нескольких команд одной транзакцией; возвращает число изменённых."""
+        with self._connection() as conn:
+            return self._set_team_status_many(conn.cursor(), team_ids, status)
+
+    def _set_team_status_many(self, cursor: sqlite3.Cursor, team_ids: List[int], status: str) -> int:
+        changed = 0
+        team_ids = list(team_ids)
+        for start in range(0, len(team_ids), STATUS_UPDATE_CHUNK):
+            chunk = team_ids[start:start + STATUS_UPDATE_CHUNK]
+            # Команды, у которых статус уже такой, не трогаем, чтобы счётчик отражал реальные изменения
+            cursor.execute(f'''
+                UPDATE teams
+                SET status = ?
+                WHERE id IN ({', '.join('?' * len(chunk))}) AND status != ?
+            ''', (status, *chunk, status))
+            changed += cursor.rowcount
+        return changed
+
+    def update_pending_teams(self, status: str) -> int:
+        """Переводит все ожидающие команды в status; возвращает их число."""
+        with self._connection() as conn:
+            return self._set_pending_teams_status(conn.cursor(), status)
+
+    def _set_pending_teams_status(self, cursor: sqlite3.Cursor, status: str) -> int:
+        cursor.execute('''
+            UPDATE teams
+            SET status = ?
+            WHERE status = 'pending'
+        ''', (status,))  # По индексу idx_teams_status_date
+        return cursor.rowcount
+
+    def find_registered_players(self, telegram_ids: List[int], usernames: List[str]) -> List[dict]:
+        """Игроки из уже заявленных (не отклонённых) команд с такими telegram_id или username.
+
+        Один запрос на весь состав: оба условия идут по индексам idx_players_telegram_id
+        и idx_players_telegram_username, username сравниваются без учёта регистра.
+        """
+        telegram_ids = [telegram_id for telegram_id in telegram_ids if telegram_id is not None]
+        usernames = [username for username in usernames if username]
+        if not telegram_ids and not usernames:
+            return []
+        cursor = self._connection().execute(f'''
+            SELECT p.nickname, p.telegram_username, p.telegram_id, t.team_name
+            FROM players p
+            JOIN teams t ON t.id = p.team_id
+            WHERE (p.telegram_id IN ({', '.join('?' * len(telegram_ids))})
+                   OR p.telegram_username COLLATE NOCASE IN ({', '.join('?' * len(usernames))}))
+              AND t.status != 'rejected'
+        ''', (*telegram_ids, *usernames))
+        return [
+            {'nickname': nickname, 'username': username, 'telegram_id': telegram_id, 'team_name': team_name}
+            for nickname, username, telegram_id, team_name in cursor
+        ]
+
+    def get_players_to_verify(self, after_id: int, limit: int) -> List[dict]:
+        """Игроки ожидающих и одобренных команд с id больше after_id, по возрастанию id."""
+        cursor = self._connection().execute('''
+            SELECT p.id, p.team_id, p.nickname, p.telegram_username, p.telegram_id
+            FROM players p
+            JOIN teams t ON t.id = p.team_id
+            WHERE p.id > ? AND t.status IN ('pending', 'approved')
+            ORDER BY p.id
+            LIMIT ?
+        ''', (after_id, limit))
+        return [
+            {'id': player_id, 'team_id': team_id, 'nickname': nickname, 'username': username, 'telegram_id': telegram_id}
+            for player_id, team_id, nickname, username, telegram_id in cursor
+        ]
+
+    def get_checkpoint(self, name: str) -> Optional[Tuple[int, float]]:
+        """(последний обработанный id, начало текущего цикла) фоновой задачи name."""
+        return self._connection().execute(
+            'SELECT position, cycle_started_at FROM job_checkpoints WHERE name = ?', (name,)
+        ).fetchone()
+
+    def save_verification_batch(self, name: str, results: List[Tuple[int, int, Optional[int], str]], verified_at: float,
+                                position: int, cycle_started_at: float):
+        with self._connection() as conn:
+            self._save_verification_batch(conn.cursor(), name, results, verified_at, position, cycle_started_at)
+
+    def _save_verification_batch(self, cursor: sqlite3.Cursor, name: str, results: List[Tuple[int, int, Optional[int], str]],
+                                 verified_at: float, position: int, cycle_started_at: float):
+        """Сохраняет результаты проверки (id игрока, id команды, telegram_id, результат) вместе с контрольной точкой."""
+        # В SET справа везде старые значения строки, поэтому CASE сравнивает с прежним результатом
+        cursor.executemany('''
+            UPDATE players
+            SET telegram_id = COALESCE(telegram_id, ?),
+                verification_changed_at = CASE WHEN last_verification IS ? THEN verification_changed_at ELSE ? END,
+                last_verification = ?,
+                last_verified_at = ?
+            WHERE id = ?
+        ''', [
+            (telegram_id, result, verified_at, result, verified_at, player_id)
+            for player_id, _, telegram_id, result in results
+        ])
+        cursor.execute('''
+            INSERT INTO job_checkpoints (name, position, cycle_started_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET position = excluded.position, cycle_started_at = excluded.cycle_started_at
+        ''', (name, position, cycle_started_at))
+
+    def get_noncompliant_teams(self, since: float) -> List[dict]:
+        """Ожидающие и одобренные команды, где с момента since игроки перестали проходить проверку."""
+        teams: Dict[int, dict] = {}
+        for team_id, team_name, status, nickname, username, result in self._connection().execute('''
+            SELECT t.id, t.team_name, t.status, p.nickname, p.telegram_username, p.last_verification
+            FROM players p
+            JOIN teams t ON t.id = p.team_id
+            WHERE p.verification_changed_at >= ?
+              AND p.last_verification IN ('not_subscribed', 'not_found')
+              AND t.status IN ('pending', 'approved')
+            ORDER BY t.id, p.id
+        ''', (since,)):
+            team = teams.setdefault(team_id, {'id': team_id, 'team_name': team_name, 'status': status, 'players': []})
+            team['players'].append((nickname, username, result))
+        return list(teams.values())
+
+    def create_broadcast(self, text: str, created_by: int) -> Tuple[int, int]:
+        with self._connection() as conn:
+            return self._insert_broadcast(conn.cursor(), text, created_by)
+
+    def _insert_broadcast(self, cursor: sqlite3.Cursor, text: str, created_by: int) -> Tuple[int, int]:
+        """Создаёт рассылку всем игрокам ожидающих и одобренных команд; возвращает (id, число получателей)."""
+        now = time.time()
+        cursor.execute('''
+            INSERT INTO broadcasts (text, created_by, created_at) VALUES (?, ?, ?)
+        ''', (text, created_by, now))
+        broadcast_id = cursor.lastrowid
+        cursor.execute('''
+            INSERT INTO notifications (chat_id, kind, broadcast_id, created_at)
+            SELECT DISTINCT p.telegram_id, 'broadcast', ?, ?
+            FROM players p
+            JOIN teams t ON t.id = p.team_id
+            WHERE p.telegram_id IS NOT NULL AND t.status IN ('pending', 'approved')
+        ''', (broadcast_id, now))
+        recipients = cursor.rowcount
+        cursor.execute('UPDATE broadcasts SET recipients = ? WHERE id = ?', (recipients, broadcast_id))
+        return broadcast_id, recipients
+
+    def claim_notifications(self, limit: int) -> List[dict]:
+        with self._connection() as conn:
+            return self._claim_notifications(conn.cursor(), limit)
+
+    def _claim_notifications(self, cursor: sqlite3.Cursor, limit: int) -> List[dict]:
+        """Забирает до limit ожидающих уведомлений, переводя их в состояние sending.
+
+        Состояние фиксируется до отправки: если процесс упадёт во время отправки,
+        такие уведомления не будут отправлены повторно (см. fail_interrupted_notifications).
+        """
+        cursor.execute('''
+            SELECT n.id, n.chat_id, n.kind, n.status, t.team_name, t.admin_comment, b.text
+            FROM notifications n
+            LEFT JOIN teams t ON t.id = n.team_id
+            LEFT JOIN broadcasts b ON b.id = n.broadcast_id
+            WHERE n.state = 'pending'
+            ORDER BY n.id
+            LIMIT ?
+        ''', (limit,))
+        notifications = [
+            {'id': row[0], 'chat_id': row[1], 'kind': row[2], 'status': row[3],
+             'team_name': row[4], 'admin_comment': row[5], 'text': row[6]}
+            for row in cursor.fetchall()
+        ]
+        cursor.executemany(
+            "UPDATE notifications SET state = 'sending', updated_at = ? WHERE id = ?",
+            [(time.time(), notification['id']) for notification in notifications]
+        )
+        return notifications
+
+    def finish_notifications(self, results: List[Tuple[int, str, Optional[str]]]):
+        with self._connection() as conn:
+            self._finish_notifications(conn.cursor(), results)
+
+    def _finish_notifications(self, cursor: sqlite3.Cursor, results: List[Tuple[int, str, Optional[str]]]):
+        """Записывает итог отправки: (id уведомления, sent или failed, текст ошибки)."""
+        now = time.time()
+        cursor.executemany(
+            'UPDATE notifications SET state = ?, error = ?, updated_at = ? WHERE id = ?',
+            [(state, error, now, notification_id) for notification_id, state, error in results]
+        )
+
+    def fail_interrupted_notifications(self) -> int:
+        """Помечает неудавшимися уведомления, отправка которых прервалась (доставка неизвестна)."""
+        with self._connection() as conn:
+            cursor = conn.execute('''
+                UPDATE notifications SET state = 'failed', error = 'interrupted', updated_at = ?
+                WHERE state = 'sending'
+            ''', (time.time(),))
+            return cursor.rowcount
+
+    def get_broadcasts_progress(self, limit: int = 5) -> List[dict]:
+        """Последние рассылки с числом уведомлений в каждом состоянии."""
+        broadcasts = self._connection().execute('''
+            SELECT id, text, created_at, recipients FROM broadcasts ORDER BY id DESC LIMIT ?
+        ''', (limit,)).fetchall()
+        progress = []
+        for broadcast_id, text, created_at, recipients in broadcasts:
+            states = dict(self._connection().execute('''
+                SELECT state, COUNT(*) FROM notifications WHERE broadcast_id = ? GROUP BY state
+            ''', (broadcast_id,)))
+            progress.append({
+                'id': broadcast_id,
+                'text': text,
+                'created_at': created_at,
+                'recipients': recipients,
+                'states': states,
+            })
+        return progress
+
     def team_name_exists(self, team_name: str) -> bool:
-        with sqlite3.connect(self.db_file) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT 1 FROM teams WHERE LOWER(team_name) = LOWER(?)
-            ''', (team_name.lower(),))  # Приводим к нижнему регистру
+                SELECT 1 FROM teams WHERE team_name = ? COLLATE NOCASE
+            ''', (team_name,))  # Сравнение без учёта регистра по индексу idx_teams_team_name
             return cursor.fetchone() is not None
 
     def get_all_teams(self) -> List[dict]:
-        with sqlite3.connect(self.db_file) as conn:
+        return list(self.iter_teams())
+
+    def get_teams_page(self, status: Optional[str] = None, limit: int = TEAMS_PAGE_SIZE,
+                       after_id: Optional[int] = None, before_id: Optional[int] = None) -> Tuple[List[dict], bool]:
+        """Страница команд (новые сверху) вместе с игроками одним запросом.
+
+        Пагинация по ключу (registration_date, id): after_id — последняя команда предыдущей
+        страницы (листаем дальше), before_id — первая команда следующей страницы (листаем назад).
+        Возвращает команды и признак того, что в выбранном направлении есть ещё команды.
+        """
+        conditions = []
+        params = []
+        if status:
+            conditions.append('t.status = ?')
+            params.append(status)
+        if after_id is not None:
+            conditions.append('(t.registration_date, t.id) < (SELECT registration_date, id FROM teams WHERE id = ?)')
+            params.append(after_id)
+        if before_id is not None:
+            conditions.append('(t.registration_date, t.id) > (SELECT registration_date, id FROM teams WHERE id = ?)')
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        # Назад идём в обратном порядке и разворачиваем результат
+        order = 'ASC' if before_id is not None else 'DESC'
+        # Берём на одну команду больше, чтобы узнать, есть ли следующая страница
+        params.append(limit + 1)
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                WITH page AS (
+                    SELECT t.id, t.team_name, t.status, t.registration_date, t.captain_contact, t.admin_comment
+                    FROM teams t
+                    {where}
+                    ORDER BY t.registration_date {order}, t.id {order}
+                    LIMIT ?
+                )
+                SELECT page.id, page.team_name, page.status, page.registration_date, page.captain_contact,
+                       page.admin_comment, p.nickname, p.telegram_username, p.telegram_id
+                FROM page
+                LEFT JOIN players p ON p.team_id = page.id
+                ORDER BY page.registration_date {order}, page.id {order}, p.id
+            ''', params)
+
+            teams = []
+            for row in cursor:
+                if not teams or teams[-1]['id'] != row[0]:
+                    teams.append({
+                        'id': row[0],
+                        'team_name': row[1],
+                        'status': row[2],
+                        'registration_date': row[3],
+                        'captain_contact': row[4],
+                        'admin_comment': row[5],
+                        'players': []
+                    })
+                if row[6] is not None:
+                    teams[-1]['players'].append((row[6], row[7], row[8]))
+
+        has_more = len(teams) > limit
+        teams = teams[:limit]
+        if before_id is not None:
+            teams.reverse()
+        return teams, has_more
+
+    def iter_teams(self, status: Optional[str] = None, page_size: int = TEAMS_PAGE_SIZE) -> Iterator[dict]:
+        """Последовательно отдаёт все команды, держа в памяти не больше одной страницы."""
+        after_id = None
+        while True:
+            teams, has_more = self.get_teams_page(status, page_size, after_id=after_id)
+            yield from teams
+            if not has_more:
+                return
+            after_id = teams[-1]['id']
+
+    def get_cached_telegram_id(self, username: str) -> Optional[Tuple[Optional[int], float]]:
+        """Запись кэша username → (telegram_id, resolved_at) или None, если записи нет."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT telegram_id, resolved_at FROM username_cache WHERE username = ?
+            ''', (username.lower(),))
+            return cursor.fetchone()
+
+    def save_cached_telegram_id(self, username: str, telegram_id: Optional[int], resolved_at: float):
+        with self._connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO username_cache (username, telegram_id, resolved_at)
+                VALUES (?, ?, ?)
+            ''', (username.lower(), telegram_id, resolved_at))
+
+    def get_known_telegram_ids(self, limit: int) -> List[Tuple[str, int]]:
+        """Известные пары (username, telegram_id) зарегистрированных игроков, последние — первыми."""
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT t.id, t.team_name, t.status, t.registration_date, t.captain_contact, t.admin_comment
+                SELECT LOWER(telegram_username), telegram_id
+                FROM players
+                WHERE telegram_id IS NOT NULL
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (limit,))
+            return cursor.fetchall()
+
+    def get_channel_members(self, since: float) -> List[Tuple[int, str, float]]:
+        """Записи индекса подписчиков, подтверждённые не раньше since."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id, status, updated_at FROM channel_members WHERE updated_at >= ?
+            ''', (since,))
+            return cursor.fetchall()
+
+    def save_channel_member(self, user_id: int, status: str, updated_at: float):
+        with self._connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO channel_members (user_id, status, updated_at)
+                VALUES (?, ?, ?)
+            ''', (user_id, status, updated_at))
+
+    def get_user_data(self) -> List[Tuple[int, str]]:
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id, data FROM user_data')
+            return cursor.fetchall()
+
+    def get_conversations(self, name: str) -> List[Tuple[str, str]]:
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT key, state FROM conversations WHERE name = ?', (name,))
+            return cursor.fetchall()
+
+    def save_persistence(self, user_data: Dict[int, Optional[str]],
+                         conversations: Dict[Tuple[str, str], Optional[str]]):
+        """Записывает накопленные изменения одной транзакцией; значение None означает удаление."""
+        with self._connection() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)',
+                [(user_id, data) for user_id, data in user_data.items() if data is not None]
+            )
+            conn.executemany(
+                'DELETE FROM user_data WHERE user_id = ?',
+                [(user_id,) for user_id, data in user_data.items() if data is None]
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)',
+                [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+            )
+            conn.executemany(
+                'DELETE FROM conversations WHERE name = ? AND key = ?',
+                [(name, key) for (name, key), state in conversations.items() if state is None]
+            )
+
+    def get_stats(self, hours: int = 24, days: int = 7) -> dict:
+        """Статистика из счётчиков, которые поддерживают триггеры (migration 7).
+
+        Читает несколько строк счётчиков и не больше days * 24 почасовых строк,
+        поэтому время не зависит от размера турнира.
+        """
+        now = datetime.utcnow()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT key, value FROM stats_counters')
+            counters = dict(cursor.fetchall())
+
+            cursor.execute('''
+                SELECT hour, count FROM registrations_by_hour
+                WHERE hour >= ?
+                ORDER BY hour
+            ''', ((now - timedelta(hours=hours - 1)).strftime('%Y-%m-%d %H:00'),))
+            by_hour = cursor.fetchall()
+
+            cursor.execute('''
+                SELECT substr(hour, 1, 10), SUM(count) FROM registrations_by_hour
+                WHERE hour >= ?
+                GROUP BY 1
+                ORDER BY 1
+            ''', ((now - timedelta(days=days - 1)).strftime('%Y-%m-%d 00:00'),))
+            by_day = cursor.fetchall()
+
+        teams = {key[len('teams_'):]: value for key, value in counters.items() if key.startswith('teams_')}
+        teams_total = sum(teams.values())
+        players = counters.get('players', 0)
+        return {
+            'teams': teams,
+            'teams_total': teams_total,
+            'players': players,
+            'avg_players': players / teams_total if teams_total else 0.0,
+            'by_hour': by_hour,
+            'by_day': by_day,
+        }
+
+    def iter_export_rows(self, status: Optional[str] = None, date_from: Optional[date] = None,
+                         date_to: Optional[date] = None, batch_size: int = 1000) -> Iterator[tuple]:
+        """Строки «команда × игрок» для выгрузки, по batch_size за раз.
+
+        date_from и date_to включительно, по дате регистрации (UTC). Команды без игроков
+        выгружаются одной строкой с пустыми полями игрока.
+        """
+        conditions = []
+        params = []
+        if status:
+            conditions.append('t.status = ?')
+            params.append(status)
+        if date_from:
+            conditions.append('t.registration_date >= ?')
+            params.append(date_from.isoformat())
+        if date_to:
+            conditions.append('t.registration_date < ?')
+            params.append((date_to + timedelta(days=1)).isoformat())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        cursor = self._connection().cursor()
+        try:
+            # Игроки идут по индексу idx_players_team_id, поэтому сортировка не требует временного B-дерева
+            cursor.execute(f'''
+                SELECT t.id, t.team_name, t.status, t.registration_date, t.captain_contact, t.admin_comment,
+                       p.nickname, p.telegram_username, p.telegram_id, p.is_captain
                 FROM teams t
-                ORDER BY t.registration_date DESC
-            ''')
-            
-            teams = []
-            for team in cursor.fetchall():
-                cursor.execute('''
-                    SELECT nickname, telegram_username, telegram_id
-                    FROM players
-                    WHERE team_id = ?
-                ''', (team[0],))
-                
-                players = cursor.fetchall()
-                teams.append({
-                    'id': team[0],
-                    'team_name': team[1],
-                    'status': team[2],
-                    'registration_date': team[3],
-                    'captain_contact': team[4],
-                    'admin_comment': team[5],
-                    'players': players
-                })
-            
-            return teams
\ No newline at end of file
+                LEFT JOIN players p ON p.team_id = t.id
+                {where}
+                ORDER BY t.registration_date, t.id
+            ''', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
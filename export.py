@@ -0,0 +1,65 @@
+# export.py
+import csv
+from typing import Iterable
+
+try:
+    # XLSX-выгрузка доступна, только если установлен openpyxl
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+# Заголовки столбцов выгрузки в порядке полей Database.iter_export_rows
+EXPORT_COLUMNS = [
+    "ID команды",
+    "Команда",
+    "Статус",
+    "Дата регистрации (UTC)",
+    "Контакт капитана",
+    "Комментарий",
+    "Никнейм игрока",
+    "Telegram username",
+    "Telegram ID",
+    "Капитан",
+]
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+
+def _format_row(row: tuple) -> list:
+    row = list(row)
+    row[9] = "" if row[9] is None else ("да" if row[9] else "нет")
+    return row
+
+
+def write_csv(rows: Iterable[tuple], path: str) -> int:
+    """Построчно пишет выгрузку в CSV и возвращает число строк."""
+    count = 0
+    # utf-8-sig: Excel правильно открывает кириллицу
+    with open(path, 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(_format_row(row))
+            count += 1
+    return count
+
+
+def write_xlsx(rows: Iterable[tuple], path: str) -> int:
+    """Пишет выгрузку в XLSX в потоковом режиме openpyxl (write_only)."""
+    if Workbook is None:
+        raise RuntimeError("Для выгрузки в XLSX установите openpyxl")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Команды")
+    sheet.append(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        sheet.append(_format_row(row))
+        count += 1
+    workbook.save(path)
+    return count
+
+
+WRITERS = {
+    'csv': write_csv,
+    'xlsx': write_xlsx,
+}
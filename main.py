@@ -2,17 +2,38 @@ import logging
 import os
 import re
 import asyncio
+import sqlite3
+from typing import Optional
 
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, filters, ContextTypes
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ChatMemberHandler, ConversationHandler, TypeHandler, filters, ContextTypes
+from telegram.request import BaseRequest
 from pyrogram import Client
 from pyrogram.enums import ParseMode
 
 # Добавленные импорты
 from database import Database
-from admin_handlers import admin_command, admin_teams_list, handle_team_action
+from async_database import AsyncDatabase
+from admin_handlers import admin_command, admin_teams_list, handle_team_action, admin_stats, export_command, handle_bulk_action, find_command, broadcast_command, handle_broadcast_action, broadcasts_command
 from registration_status import check_registration_status
+from username_cache import UsernameCache
+from subscriber_index import SubscriberIndex, track_channel_member
+from rate_limiter import OutboundScheduler
+from persistence import SQLitePersistence
+from webhook import WEBHOOK_URL, run_webhook
+from reverification import SWEEP_INTERVAL, SubscriptionSweeper
+from notifications import NOTIFY_INTERVAL, Notifier
+from registration_state import (
+    REGISTRATION_KEY, REGISTRATION_SWEEP_INTERVAL, RegistrationState, RegistrationSweeper,
+    clear_registration, get_registration, touch_registration
+)
+from metrics import REGISTRY, METRICS_PORT, MetricsServer, instrument_application
+from progress_message import ProgressMessage
+from subscription import (
+    SUBSCRIBED_STATUSES, SUBSCRIBED, NOT_SUBSCRIBED, NOT_FOUND, CHECK_FAILED,
+    get_member_status, verify_players
+)
 
 
 # Enable logging
@@ -27,6 +48,10 @@ load_dotenv()
 API_ID = int(os.environ.get("API_ID"))
 API_HASH = os.environ.get("API_HASH")
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
+# Интервал перечитывания списка администраторов, секунд
+ADMIN_REFRESH_SECONDS = float(os.environ.get("ADMIN_REFRESH_SECONDS", 60))
+# Сколько обновлений обрабатывать одновременно (1 — строго по очереди)
+CONCURRENT_UPDATES = int(os.environ.get("CONCURRENT_UPDATES", 1))
 
 # Define states
 (
@@ -41,9 +66,6 @@ BOT_TOKEN = os.environ.get("BOT_TOKEN")
     WAITING_TEAM_NAME
 ) = range(9)  # Изменено на range(10)
 
-# Channel ID for subscription check
-CHANNEL_ID = "@m5cup"
-
 # Pyrogram Client (UserBot)
 userbot = Client(
     name="my_userbot",
@@ -54,7 +76,16 @@ userbot = Client(
 )
 
 # Инициализация базы данных
-db = Database()
+db = AsyncDatabase(Database())
+
+# Кэш username → telegram_id для проверки составов
+username_cache = UsernameCache(db)
+
+# Локальный индекс подписчиков канала
+subscribers = SubscriberIndex(db)
+
+# HTTP-эндпоинт метрик в формате Prometheus
+metrics_server = MetricsServer()
 
 # Клавиатуры
 def get_main_keyboard():
@@ -128,11 +159,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 Удачи в турнире! 🎯"""
 
+    clear_registration(context)
     await update.message.reply_text(welcome_message, reply_markup=get_main_keyboard())
     return ConversationHandler.END
 
 async def start_registration(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the registration process."""
+    context.user_data[REGISTRATION_KEY] = RegistrationState()
     await update.message.reply_text(
         "📢 Для участия в M5 Domination Cup необходимо быть подписанным на наш канал!\n\n"
         "🔗 Подпишись на [M5 Cup](https://t.me/m5cup), затем нажми \"Проверить подписку\".\n\n"
@@ -144,6 +177,7 @@ async def start_registration(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Return to main menu."""
+    clear_registration(context)
     await update.message.reply_text(
         "Вы вернулись в главное меню. Выберите нужное действие:",
         reply_markup=get_main_keyboard()
@@ -193,9 +227,9 @@ async def check_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Check if user is subscribed to the channel."""
     try:
         user_id = update.message.from_user.id
-        chat_member = await context.bot.get_chat_member(chat_id=CHANNEL_ID, user_id=user_id)
+        status = await get_member_status(context.bot, user_id, subscribers)
 
-        if chat_member.status in ['member', 'administrator', 'creator']:
+        if status in SUBSCRIBED_STATUSES:
             await update.message.reply_text(
                 "🎮 Отлично! Теперь введи название твоей команды.\n\n"
                 "✍🏼 Напиши название в ответном сообщении.",
@@ -226,14 +260,14 @@ async def receive_team_name(update: Update, context: ContextTypes.DEFAULT_TYPE)
     team_name = update.message.text
 
     # Проверяем, существует ли команда с таким именем (без учета регистра)
-    if db.team_name_exists(team_name):
+    if await db.team_name_exists(team_name):
         await update.message.reply_text(
             "⚠️ Команда с таким названием уже зарегистрирована. Пожалуйста, выберите другое название.",
             reply_markup=get_back_keyboard()  # Or other appropriate keyboard
         )
         return TEAM_NAME  # Return to team name input state
 
-    context.user_data['team_name'] = team_name
+    get_registration(context).team_name = team_name
 
     await update.message.reply_text(
         "Теперь введи свой игровой никнейм (это будет твой никнейм в игре, и ты будешь капитаном команды):\n\n"
@@ -242,28 +276,10 @@ async def receive_team_name(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
     return CAPTAIN_NICKNAME
 
-async def get_tg_id_by_username(username: str):
-    """Gets Telegram ID by username using Pyrogram."""
-    try:
-        users = await userbot.get_users(username)
-        if users:
-            if isinstance(users, list):
-                if users:
-                    return users[0].id
-                else:
-                    return None
-            else:
-                return users.id
-        else:
-            return None
-    except Exception as e:
-        logger.error(f"Error getting Telegram ID for {username}: {e}")
-        return None
-    
 async def receive_captain_nickname(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Receive captain's nickname and proceed to player list."""
     captain_nickname = update.message.text
-    context.user_data['captain_nickname'] = captain_nickname
+    get_registration(context).captain_nickname = captain_nickname
 
     await update.message.reply_text(
         "Теперь укажи состав команды (минимум 3 игрока, не включая капитана):\n\n"
@@ -279,6 +295,33 @@ async def receive_captain_nickname(update: Update, context: ContextTypes.DEFAULT
     )
     return PLAYERS_LIST
 
+# Отметки игроков в сообщении о ходе проверки подписки
+VERIFICATION_MARKS = {
+    SUBSCRIBED: "✅",
+    NOT_SUBSCRIBED: "❌",
+    NOT_FOUND: "❓",
+    CHECK_FAILED: "⚠️",
+}
+
+def render_verification_progress(players_data: list, results: list) -> str:
+    """Текст сообщения о ходе проверки: по строке на игрока, ⏳ — проверка ещё идёт."""
+    done = sum(result is not None for result in results)
+    if done < len(results):
+        lines = [f"⏳ Проверяем подписку игроков на канал ({done}/{len(results)}):"]
+    else:
+        lines = ["📋 Проверка подписки завершена:"]
+    for player, result in zip(players_data, results):
+        lines.append(f"{VERIFICATION_MARKS.get(result, '⏳')} {player['nickname']} – @{player['username']}")
+    return "\n".join(lines)
+
+def render_registered_players(registered: list) -> str:
+    """Сообщение об игроках, уже заявленных в других командах."""
+    error_message = "⚠️ Эти игроки уже заявлены в других командах:\n"
+    for player in registered:
+        error_message += f"• {player['nickname']} – @{player['username']} (команда «{player['team_name']}»)\n"
+    error_message += "Пожалуйста, исправьте список игроков и отправьте его снова."
+    return error_message
+
 async def check_players_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Check and validate players list and check subscription status."""
     players_text = update.message.text
@@ -302,7 +345,8 @@ async def check_players_subscription(update: Update, context: ContextTypes.DEFAU
     # Словарь для хранения информации об игроках (nickname, username, telegram_id)
     players_data = []
     # Добавляем капитана в список players_data
-    captain_nickname = context.user_data.get('captain_nickname')
+    registration = get_registration(context)
+    captain_nickname = registration.captain_nickname
     update_user = update.message.from_user
     players_data.append({"nickname": captain_nickname, "username": update_user.username, "telegram_id": update_user.id, 'is_captain': True})
     for nickname, username in players:
@@ -342,39 +386,53 @@ async def check_players_subscription(update: Update, context: ContextTypes.DEFAU
         )
         return PLAYERS_LIST
 
-    context.user_data['players_data'] = players_data
+    # Игроки, уже заявленные в других командах, — до проверки подписки, чтобы не тратить запросы к API
+    registered = await db.find_registered_players(
+        [player['telegram_id'] for player in players_data],
+        [player['username'] for player in players_data]
+    )
+    if registered:
+        await update.message.reply_text(render_registered_players(registered), reply_markup=get_back_keyboard())
+        return PLAYERS_LIST
 
-    await update.message.reply_text(
-        "⏳ Проверяем подписку игроков на канал. Это может занять некоторое время...",
+    # Одно сообщение со списком игроков правится по мере готовности проверок
+    progress_results = [None] * len(players_data)
+    status_message = await update.message.reply_text(
+        render_verification_progress(players_data, progress_results),
         reply_markup=ReplyKeyboardRemove()
     )
+    progress = ProgressMessage(status_message)
+
+    def on_result(index: int, result: str):
+        progress_results[index] = result
+        progress.update(render_verification_progress(players_data, progress_results))
 
     unsubscribed_players = []
     subscribed_players = []
 
-    for player in players_data:
-        if player['telegram_id'] is None:
-            telegram_id = await get_tg_id_by_username(player['username'])
-            player['telegram_id'] = telegram_id
-        else:
-            telegram_id = player['telegram_id']
-        if telegram_id:
-            try:
-                chat_member = await context.bot.get_chat_member(chat_id=CHANNEL_ID, user_id=telegram_id)
-                if chat_member.status in ['member', 'administrator', 'creator']:
-                    subscribed_players.append(f"{player['nickname']} – @{player['username']}")
-                else:
-                    unsubscribed_players.append(f"{player['nickname']} – @{player['username']}")
-            except Exception as e:
-                logger.error(f"Error checking subscription for user {telegram_id} (Bot API): {e}")
-                if "Participant_id_invalid" in str(e):
-                    unsubscribed_players.append(f"{player['nickname']} – @{player['username']} (Ошибка проверки)")
-                else:
-                    unsubscribed_players.append(f"{player['nickname']} – @{player['username']} (Ошибка проверки)")
+    # Игроки проверяются параллельно, результаты приходят в порядке состава
+    results = await verify_players(context.bot, userbot, players_data, username_cache, subscribers, on_result)
+    await progress.close()
 
+    # Игрок мог сменить @username после регистрации в другой команде: повторяем проверку
+    # по telegram_id, которые стали известны только после проверки подписки
+    registered = await db.find_registered_players(
+        [player['telegram_id'] for player in players_data if not player['is_captain']], []
+    )
+    if registered:
+        await update.message.reply_text(render_registered_players(registered), reply_markup=get_back_keyboard())
+        return PLAYERS_LIST
 
+    for player, result in zip(players_data, results):
+        player_line = f"{player['nickname']} – @{player['username']}"
+        if result == SUBSCRIBED:
+            subscribed_players.append(player_line)
+        elif result == NOT_SUBSCRIBED:
+            unsubscribed_players.append(player_line)
+        elif result == NOT_FOUND:
+            unsubscribed_players.append(f"{player_line} (Проверьте правильность юзернейма)")
         else:
-            unsubscribed_players.append(f"{player['nickname']} – @{player['username']} (Проверьте правильность юзернейма)")
+            unsubscribed_players.append(f"{player_line} (Ошибка проверки)")
 
     if unsubscribed_players:
         message = "⚠️ Следующие игроки не подписаны на канал @m5cup или не удалось проверить их подписку:\n"
@@ -384,10 +442,8 @@ async def check_players_subscription(update: Update, context: ContextTypes.DEFAU
     else:
         message = "✅ Все игроки из списка подписаны на канал @m5cup!"
 
-    # Сохраняем сообщение для повторного использования
-    context.user_data['subscription_message'] = message
     # Сохраняем информацию об игроках, включая telegram_id
-    context.user_data['players_data'] = players_data
+    registration.set_players(players_data)
 
     await update.message.reply_text(message, reply_markup=get_subscription_result_keyboard())
     return SUBSCRIPTION_CHECK_RESULT
@@ -455,19 +511,29 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def finish_registration(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Complete the registration process."""
     captain_contact = update.message.text
-    context.user_data['captain_contact'] = captain_contact
 
-    team_name = context.user_data.get('team_name', 'Не указано')
-    players_data = context.user_data.get('players_data', [])
+    # Диалог в любом случае завершается, поэтому состояние регистрации больше не нужно
+    registration = clear_registration(context) or RegistrationState()
+    team_name = registration.team_name or 'Не указано'
+    players_data = registration.players_data()
 
     try:
-        team_id = db.register_team(
+        team_id = await db.register_team(
             team_name=team_name,
             players=players_data,
             captain_contact=captain_contact
         )
         logger.info(f"Team '{team_name}' registered successfully with ID: {team_id}")
 
+    except sqlite3.IntegrityError:
+        # Название успели занять, пока капитан заполнял остальные данные
+        logger.warning(f"Team name '{team_name}' is already taken")
+        await update.message.reply_text(
+            "⚠️ Команда с таким названием уже зарегистрирована. Пожалуйста, начните регистрацию заново и выберите другое название.",
+            reply_markup=get_main_keyboard()
+        )
+        return ConversationHandler.END
+
     except Exception as e:
         logger.error(f"Error saving team data to database: {e}")
         await update.message.reply_text(
@@ -524,19 +590,70 @@ async def post_init(application: Application):
     print("Starting Pyrogram client...")
     await userbot.start()
     print("Pyrogram client started.")
-
-
-def main() -> None:
-    """Start the bot."""
-    application = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
+    await username_cache.preload()
+    await subscribers.load()
+    if METRICS_PORT:
+        await metrics_server.start()
+
+async def refresh_admins(context: ContextTypes.DEFAULT_TYPE):
+    """Периодически перечитывает список администраторов (его могли изменить другие процессы)."""
+    await context.bot_data['db'].load_admins()
+
+async def post_shutdown(application: Application):
+    """Post shutdown hook to close database connections."""
+    await metrics_server.stop()
+    await application.bot_data['db'].aclose()
+
+
+def build_application(token: str = BOT_TOKEN, request: Optional[BaseRequest] = None) -> Application:
+    """Собирает приложение со всеми обработчиками.
+
+    request подменяет HTTP-клиент Bot API (нагрузочный тест передаёт сюда фальшивый Bot API).
+    """
+    scheduler = OutboundScheduler()
+    builder = (
+        Application.builder()
+        .token(token)
+        # Все исходящие запросы проходят через планировщик с учётом лимитов Telegram
+        .rate_limiter(scheduler)
+        .persistence(SQLitePersistence(db))
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
 
     # Добавляем базу данных в bot_data, чтобы она была доступна в обработчиках
     application.bot_data['db'] = db
+    application.bot_data['subscribers'] = subscribers
+
+    application.job_queue.run_repeating(refresh_admins, interval=ADMIN_REFRESH_SECONDS, first=ADMIN_REFRESH_SECONDS)
+
+    # Фоновая перепроверка подписки игроков небольшими партиями
+    sweeper = SubscriptionSweeper(db, userbot, username_cache, subscribers)
+    application.job_queue.run_repeating(sweeper.run_batch, interval=SWEEP_INTERVAL, first=SWEEP_INTERVAL)
+
+    # Уведомления игрокам о статусе команды и рассылки отправляются из очереди в базе
+    notifier = Notifier(db)
+    application.job_queue.run_repeating(notifier.run_batch, interval=NOTIFY_INTERVAL, first=NOTIFY_INTERVAL)
+
+    # Индекс подписчиков обновляется по событиям вступления и выхода из канала
+    # (бот должен быть администратором канала, чтобы получать chat_member)
+    application.add_handler(ChatMemberHandler(track_channel_member, ChatMemberHandler.CHAT_MEMBER))
 
     # Добавляем обработчики админ-панели
     application.add_handler(CommandHandler("admin", admin_command))
-    application.add_handler(CallbackQueryHandler(admin_teams_list, pattern="^admin_teams_list$"))
+    application.add_handler(CallbackQueryHandler(admin_teams_list, pattern="^admin_teams_"))
     application.add_handler(CallbackQueryHandler(handle_team_action, pattern="^(approve|reject|comment)_team_"))
+    application.add_handler(CallbackQueryHandler(admin_stats, pattern="^admin_stats$"))
+    application.add_handler(CallbackQueryHandler(handle_bulk_action, pattern="^(select_team_|bulk_)"))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("find", find_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("broadcasts", broadcasts_command))
+    application.add_handler(CallbackQueryHandler(handle_broadcast_action, pattern="^broadcast_"))
 
     # Обновляем ConversationHandler
     conv_handler = ConversationHandler(
@@ -579,12 +696,54 @@ def main() -> None:
             ],
         },
         fallbacks=[CommandHandler('start', start)],
+        # Состояние диалога сохраняется в tournament.db и переживает перезапуск бота
+        name="registration",
+        persistent=True,
     )
 
     application.add_handler(conv_handler)
 
+    # Незавершённые регистрации: отметка активности до остальных обработчиков и очистка брошенных
+    application.add_handler(TypeHandler(Update, touch_registration), group=-1)
+    registration_sweeper = RegistrationSweeper(conv_handler, get_main_keyboard())
+    application.job_queue.run_repeating(
+        registration_sweeper.run, interval=REGISTRATION_SWEEP_INTERVAL, first=REGISTRATION_SWEEP_INTERVAL
+    )
+
+    # Замеры времени и ошибок всех обработчиков и состояние очередей и кэшей для /metrics
+    instrument_application(application)
+    REGISTRY.register_collector("bot_outbound", scheduler.stats)
+    REGISTRY.register_collector("bot_username_cache", lambda: {
+        'memory_hits': username_cache.memory_hits,
+        'db_hits': username_cache.db_hits,
+        'misses': username_cache.misses,
+        'hit_rate': username_cache.hit_rate,
+    })
+    REGISTRY.register_collector("bot_sweeper", sweeper.stats)
+    REGISTRY.register_collector("bot_notifications", notifier.stats)
+    REGISTRY.register_collector("bot_registrations", registration_sweeper.stats)
+    REGISTRY.register_collector("bot_team_cache", lambda: {
+        'hits': db.team_cache.hits,
+        'misses': db.team_cache.misses,
+        'hit_rate': db.team_cache.hit_rate,
+    })
+    REGISTRY.register_collector("bot_subscriber_index", lambda: {
+        'hits': subscribers.hits,
+        'misses': subscribers.misses,
+    })
+
+    return application
+
+
+def main() -> None:
+    """Start the bot."""
+    application = build_application()
+
     # Start the Bot
-    application.run_polling()
+    if WEBHOOK_URL:
+        asyncio.run(run_webhook(application))
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
     
     # Остановка Pyrogram клиента при выходе
     asyncio.run(userbot.stop())
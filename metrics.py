@@ -0,0 +1,218 @@
+# metrics.py
+import asyncio
+import functools
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telegram.ext import Application, ConversationHandler
+
+logger = logging.getLogger(__name__)
+
+# Адрес HTTP-эндпоинта /metrics в формате Prometheus; METRICS_PORT=0 отключает сервер
+METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9108))
+
+# Границы корзин гистограмм задержек, секунд
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Гистограмма одной серии: счётчики корзин выделяются один раз при создании."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # Последняя ячейка — значения больше верхней границы (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class MetricFamily:
+    """Семейство серий с одной меткой (handler, method, endpoint).
+
+    Серии создаются при первом обращении и дальше переиспользуются, так что горячий путь —
+    это поиск в словаре и увеличение счётчика. Метрики меняются только из потока цикла событий.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, kind: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.kind = kind
+        self.series: Dict[str, object] = {}
+
+    def labels(self, value: str):
+        series = self.series.get(value)
+        if series is None:
+            series = self.series[value] = Histogram() if self.kind == 'histogram' else Counter()
+        return series
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for value, series in sorted(self.series.items()):
+            label = f'{self.label}="{_escape(value)}"'
+            if self.kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(series.buckets, series.counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series.count}')
+                lines.append(f'{self.name}_sum{{{label}}} {series.sum}')
+                lines.append(f'{self.name}_count{{{label}}} {series.count}')
+            else:
+                lines.append(f'{self.name}{{{label}}} {series.value}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    def __init__(self):
+        self._families: List[MetricFamily] = []
+        # Функции, возвращающие текущие значения чужих счётчиков: {имя: значение}
+        self._collectors: List[Tuple[str, Callable[[], Dict[str, float]]]] = []
+
+    def histogram(self, name: str, help_text: str, label: str) -> MetricFamily:
+        family = MetricFamily(name, help_text, label, 'histogram')
+        self._families.append(family)
+        return family
+
+    def counter(self, name: str, help_text: str, label: str) -> MetricFamily:
+        family = MetricFamily(name, help_text, label, 'counter')
+        self._families.append(family)
+        return family
+
+    def register_collector(self, prefix: str, collect: Callable[[], Dict[str, float]]):
+        """Экспортирует значения collect() как gauge с именами {prefix}_{ключ}."""
+        self._collectors.append((prefix, collect))
+
+    def render(self) -> str:
+        lines = []
+        for family in self._families:
+            if family.series:
+                lines.extend(family.render())
+        for prefix, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {prefix} failed: {e}")
+                continue
+            for key, value in values.items():
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.histogram("bot_handler_duration_seconds", "Время работы обработчика обновления", "handler")
+HANDLER_ERRORS = REGISTRY.counter("bot_handler_errors_total", "Исключения в обработчиках", "handler")
+DB_LATENCY = REGISTRY.histogram("bot_db_duration_seconds", "Время запроса к базе с учётом очереди потоков", "method")
+DB_ERRORS = REGISTRY.counter("bot_db_errors_total", "Ошибки запросов к базе", "method")
+BOT_API_LATENCY = REGISTRY.histogram("bot_api_duration_seconds", "Время запроса к Bot API с учётом лимитов", "endpoint")
+BOT_API_ERRORS = REGISTRY.counter("bot_api_errors_total", "Ошибки запросов к Bot API", "endpoint")
+CLIENT_LATENCY = REGISTRY.histogram("bot_client_call_duration_seconds", "Время вызова клиента Telegram через call_api", "method")
+CLIENT_ERRORS = REGISTRY.counter("bot_client_call_errors_total", "Ошибки и таймауты вызовов через call_api", "method")
+
+
+def instrument(latency: MetricFamily, errors: MetricFamily, name: str, callback: Callable) -> Callable:
+    """Оборачивает корутинную функцию замером времени и подсчётом исключений."""
+    histogram = latency.labels(name)
+    error_counter = errors.labels(name)
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            error_counter.inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def _instrument_handler(handler):
+    if isinstance(handler, ConversationHandler):
+        for nested in handler.entry_points + handler.fallbacks:
+            _instrument_handler(nested)
+        for handlers in handler.states.values():
+            for nested in handlers:
+                _instrument_handler(nested)
+        return
+    callback = handler.callback
+    handler.callback = instrument(HANDLER_LATENCY, HANDLER_ERRORS, callback.__name__, callback)
+
+
+def instrument_application(application: Application):
+    """Добавляет замеры ко всем обработчикам, зарегистрированным в приложении (включая вложенные в диалоги)."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler)
+
+
+class MetricsServer:
+    """Минимальный HTTP-сервер, отдающий REGISTRY по GET /metrics."""
+
+    def __init__(self, registry: Registry = REGISTRY):
+        self.registry = registry
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, listen: str = METRICS_LISTEN, port: int = METRICS_PORT):
+        self._server = await asyncio.start_server(self._handle_connection, listen, port)
+        logger.info(f"Metrics available on http://{listen}:{port}/metrics")
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            request_line = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ")
+            if len(request_line) == 3 and request_line[0] == "GET" and request_line[1].split("?", 1)[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode()
+            else:
+                status, body = "404 Not Found", b""
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
@@ -0,0 +1,92 @@
+# notifications.py
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+
+from telegram.error import Forbidden, TelegramError
+from telegram.ext import ContextTypes
+
+from async_database import AsyncDatabase
+from rate_limiter import BULK
+
+logger = logging.getLogger(__name__)
+
+# Как часто отправлять очередную партию уведомлений, секунд, и её размер.
+# Общий темп всё равно ограничивает OutboundScheduler (30 сообщений в секунду на бота),
+# а интерактивные ответы имеют перед рассылкой приоритет.
+NOTIFY_INTERVAL = float(os.environ.get("NOTIFY_INTERVAL", 1))
+NOTIFY_BATCH_SIZE = int(os.environ.get("NOTIFY_BATCH_SIZE", 25))
+
+
+def render_notification(notification: dict) -> Optional[str]:
+    """Текст уведомления из строки очереди; None, если команда или рассылка уже удалены."""
+    if notification['kind'] == 'broadcast':
+        return notification['text']
+    if notification['team_name'] is None:
+        return None
+    if notification['status'] == 'approved':
+        return f"✅ Ваша команда «{notification['team_name']}» одобрена для участия в M5 Domination Cup!"
+    text = f"❌ Регистрация команды «{notification['team_name']}» отклонена."
+    if notification['admin_comment']:
+        text += f"\n\n💬 Комментарий администратора: {notification['admin_comment']}"
+    return text
+
+
+class Notifier:
+    """Отправляет уведомления из таблицы notifications (статусы команд и рассылки).
+
+    Уведомления забираются партиями и до отправки переводятся в состояние sending, так что
+    после аварийного перезапуска отправка не повторяется: прерванные уведомления помечаются
+    failed ('interrupted'). Отправка идёт с приоритетом BULK через OutboundScheduler.
+    """
+
+    def __init__(self, db: AsyncDatabase, batch_size: int = NOTIFY_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self._recovered = False
+        self._running = False
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {'sent': self.sent, 'failed': self.failed}
+
+    async def run_batch(self, context: ContextTypes.DEFAULT_TYPE):
+        # Следующий запуск JobQueue может прийти, пока предыдущая партия ещё ждёт лимитов
+        if self._running:
+            return
+        self._running = True
+        try:
+            if not self._recovered:
+                interrupted = await self.db.fail_interrupted_notifications()
+                if interrupted:
+                    logger.warning(f"{interrupted} notifications were interrupted by a restart and will not be resent")
+                self._recovered = True
+
+            notifications = await self.db.claim_notifications(self.batch_size)
+            if not notifications:
+                return
+            results = await asyncio.gather(*(self._send(context.bot, notification) for notification in notifications))
+            await self.db.finish_notifications(results)
+        finally:
+            self._running = False
+
+    async def _send(self, bot, notification: dict):
+        text = render_notification(notification)
+        if text is None:
+            self.failed += 1
+            return notification['id'], 'failed', 'deleted'
+        try:
+            await bot.send_message(chat_id=notification['chat_id'], text=text, rate_limit_args=BULK)
+        except Forbidden as e:
+            # Пользователь не запускал бота или заблокировал его
+            self.failed += 1
+            return notification['id'], 'failed', f"forbidden: {e.message}"
+        except TelegramError as e:
+            logger.warning(f"Could not deliver notification {notification['id']} to {notification['chat_id']}: {e}")
+            self.failed += 1
+            return notification['id'], 'failed', e.message
+        self.sent += 1
+        return notification['id'], 'sent', None
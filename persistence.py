@@ -0,0 +1,148 @@
+# persistence.py
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from async_database import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+# Как часто приложение передаёт накопленные изменения в хранилище, секунд.
+# При аварийной остановке теряется не больше одного интервала.
+PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", 5))
+
+
+# Классы, которые хранятся в user_data объектами: имя -> класс с to_json() и from_json()
+JSON_TYPES: Dict[str, type] = {}
+
+
+def json_type(cls: type) -> type:
+    """Декоратор: разрешает сохранять объекты класса в user_data."""
+    JSON_TYPES[cls.__name__] = cls
+    return cls
+
+
+def _default(value: Any) -> dict:
+    name = type(value).__name__
+    if JSON_TYPES.get(name) is not type(value):
+        raise TypeError(f"Object of type {name} is not JSON serializable")
+    return {'__type__': name, 'value': value.to_json()}
+
+
+def _object_hook(obj: dict) -> Any:
+    cls = JSON_TYPES.get(obj.get('__type__'))
+    if cls is not None and len(obj) == 2 and 'value' in obj:
+        return cls.from_json(obj['value'])
+    return obj
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=_default)
+
+
+def _decode(data: str) -> Any:
+    return json.loads(data, object_hook=_object_hook)
+
+
+class SQLitePersistence(BasePersistence):
+    """Хранит состояния ConversationHandler и context.user_data в tournament.db.
+
+    Приложение вызывает update_* раз в update_interval только для изменившихся ключей;
+    изменения накапливаются в памяти (повторные изменения одного ключа схлопываются)
+    и записываются одной транзакцией через поток-писатель AsyncDatabase.
+    """
+
+    def __init__(self, db: AsyncDatabase, update_interval: float = PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db = db
+        # Ожидающие записи изменения; None означает удаление
+        self._pending_user_data: Dict[int, Optional[dict]] = {}
+        self._pending_conversations: Dict[Tuple[str, str], Optional[object]] = {}
+        self._write_task: Optional[asyncio.Task] = None
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {user_id: _decode(data) for user_id, data in await self.db.get_user_data()}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        return {
+            tuple(json.loads(key)): json.loads(state)
+            for key, state in await self.db.get_conversations(name)
+        }
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        self._pending_conversations[(name, _encode(list(key)))] = new_state
+        self._schedule_write()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._pending_user_data[user_id] = data
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_user_data[user_id] = None
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    def _schedule_write(self):
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self):
+        # Даём остальным update_* из той же пачки попасть в эту же транзакцию
+        await asyncio.sleep(0)
+        while self._pending_user_data or self._pending_conversations:
+            user_data, self._pending_user_data = self._pending_user_data, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            try:
+                await self.db.save_persistence(
+                    {user_id: None if data is None else _encode(data) for user_id, data in user_data.items()},
+                    {key: None if state is None else _encode(state) for key, state in conversations.items()}
+                )
+            except Exception as e:
+                logger.error(f"Error saving conversation state: {e}")
+                # Возвращаем изменения в очередь, не затирая более новые; повторим со следующей пачкой
+                for user_id, data in user_data.items():
+                    self._pending_user_data.setdefault(user_id, data)
+                for key, state in conversations.items():
+                    self._pending_conversations.setdefault(key, state)
+                return
+
+    async def flush(self) -> None:
+        if self._write_task is not None:
+            await self._write_task
+        await self._write_pending()
@@ -0,0 +1,90 @@
+# progress_message.py
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from telegram import Message
+from telegram.error import TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Минимальный интервал между правками одного сообщения, секунд.
+# Правки расходуют тот же лимит чата (CHAT_MESSAGES_PER_SECOND), что и обычные ответы.
+PROGRESS_EDIT_INTERVAL = float(os.environ.get("PROGRESS_EDIT_INTERVAL", 1))
+
+
+class ProgressMessage:
+    """Сообщение, которое правится на месте по мере поступления результатов.
+
+    update только запоминает новый текст; правку отправляет фоновая задача не чаще
+    одного раза в interval, поэтому серия быстрых результатов превращается в одну правку
+    с последним текстом. Первая правка уходит сразу. Ошибки правки не прерывают
+    проверку: прогресс — лишь подсказка, итог отправляется отдельным сообщением.
+    """
+
+    def __init__(self, message: Message, interval: float = PROGRESS_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self._text = message.text
+        # Последний переданный текст; показан, только если совпадает с _text
+        self._latest: Optional[str] = None
+        self._pending: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sleeping = False
+        self._last_edit = float('-inf')
+        # Метрики
+        self.edits = 0
+
+    def update(self, text: str):
+        self._latest = text
+        self._pending = text
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush())
+
+    async def close(self, text: Optional[str] = None):
+        """Сразу показывает text (или последний переданный текст) вместо отложенной правки.
+
+        Ожидание паузы между правками отменяется, а уже отправленная правка дожидается
+        завершения: отменённый посреди запроса edit_text мог не дойти до Telegram.
+        """
+        self._pending = None
+        if self._task is not None:
+            if self._sleeping:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        text = text if text is not None else self._latest
+        if text is not None:
+            await self._edit(text)
+
+    async def _flush(self):
+        try:
+            while self._pending is not None:
+                delay = self._last_edit + self.interval - time.monotonic()
+                if delay > 0:
+                    self._sleeping = True
+                    try:
+                        await asyncio.sleep(delay)
+                    finally:
+                        self._sleeping = False
+                text, self._pending = self._pending, None
+                await self._edit(text)
+        finally:
+            self._task = None
+
+    async def _edit(self, text: str):
+        # Telegram отвечает ошибкой на правку без изменений
+        if text == self._text:
+            return
+        self._last_edit = time.monotonic()
+        try:
+            await self.message.edit_text(text)
+        except TelegramError as e:
+            logger.warning(f"Could not update progress message in chat {self.message.chat_id}: {e}")
+            return
+        self._text = text
+        self.edits += 1
@@ -0,0 +1,218 @@
+# rate_limiter.py
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import BOT_API_LATENCY, BOT_API_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram на исходящие сообщения
+GLOBAL_MESSAGES_PER_SECOND = float(os.environ.get("GLOBAL_MESSAGES_PER_SECOND", 30))
+CHAT_MESSAGES_PER_SECOND = float(os.environ.get("CHAT_MESSAGES_PER_SECOND", 1))
+# Сколько сообщений подряд можно отправить в один чат без ожидания
+CHAT_BURST = int(os.environ.get("CHAT_BURST", 3))
+# Сколько раз повторять запрос после RetryAfter
+MAX_RETRIES = int(os.environ.get("MAX_RETRIES", 3))
+
+# Приоритеты исходящих запросов (меньше — раньше). Передаются через rate_limit_args.
+INTERACTIVE = 0
+BULK = 1
+
+# Методы Bot API, которые отправляют или изменяют сообщения и подпадают под лимиты
+LIMITED_PREFIXES = ('send', 'edit', 'copy', 'forward')
+
+# После скольких чатов удалять из памяти полностью восстановившиеся корзины
+CHAT_BUCKETS_PRUNE_THRESHOLD = 10000
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity одновременно."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """Забирает токен и возвращает 0, либо возвращает время ожидания до следующего токена."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class OutboundScheduler(BaseRateLimiter[int]):
+    """Планировщик исходящих запросов бота.
+
+    Все вызовы Bot API проходят через process_request (см. ApplicationBuilder.rate_limiter).
+    Отправка и редактирование сообщений ограничиваются общей корзиной и корзиной чата;
+    общая очередь обслуживается по приоритету (INTERACTIVE раньше BULK). При RetryAfter
+    очередь приостанавливается на указанное время, а запрос повторяется.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_MESSAGES_PER_SECOND,
+                 chat_rate: float = CHAT_MESSAGES_PER_SECOND, chat_burst: int = CHAT_BURST,
+                 max_retries: int = MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        # Корзина и замок на чат: замок сохраняет порядок сообщений внутри чата
+        self._chats: Dict[Union[int, str], Tuple[TokenBucket, asyncio.Lock]] = {}
+        # Очередь ожидающих общего токена: (приоритет, порядковый номер, future)
+        self._queue: List = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._paused_until = 0.0
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.sent = 0
+        self.retries = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def initialize(self) -> None:
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'queue_depth': self.queue_depth,
+            'sent': self.sent,
+            'retries': self.retries,
+            'wait_time_avg': self.wait_time_total / self.sent if self.sent else 0.0,
+            'wait_time_max': self.wait_time_max,
+        }
+
+    async def _dispatch(self):
+        """Выдаёт общие токены ожидающим запросам в порядке приоритета."""
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+
+            delay = self._global_bucket.try_acquire()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                # Ожидавший запрос отменён — токен ему уже не нужен
+                self._global_bucket.refund()
+            else:
+                future.set_result(None)
+
+    async def _wait_chat(self, chat_id: Union[int, str]):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) > CHAT_BUCKETS_PRUNE_THRESHOLD:
+                self._chats = {
+                    key: value for key, value in self._chats.items()
+                    if not value[0].is_full or value[1].locked()
+                }
+            chat = self._chats[chat_id] = (TokenBucket(self.chat_rate, self.chat_burst), asyncio.Lock())
+        bucket, lock = chat
+        async with lock:
+            while True:
+                delay = bucket.try_acquire()
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+
+    async def _wait_global(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), future))
+        self._wakeup.set()
+        await future
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        # Сюда попадают все вызовы Bot API, поэтому здесь же ведутся их метрики
+        started = time.perf_counter()
+        try:
+            return await self._process(callback, args, kwargs, endpoint, data, rate_limit_args)
+        except Exception:
+            BOT_API_ERRORS.labels(endpoint).inc()
+            raise
+        finally:
+            BOT_API_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+
+    async def _process(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        limited = endpoint.startswith(LIMITED_PREFIXES)
+        priority = INTERACTIVE if rate_limit_args is None else rate_limit_args
+        chat_id = data.get('chat_id')
+
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                started = time.monotonic()
+                if chat_id is not None:
+                    await self._wait_chat(chat_id)
+                await self._wait_global(priority)
+                waited = time.monotonic() - started
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+                self.sent += 1
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                retry_after = e.retry_after if isinstance(e.retry_after, (int, float)) else e.retry_after.total_seconds()
+                logger.warning(f"Flood limit on {endpoint}, retrying in {retry_after} s")
+                # Останавливаем всю очередь: лимит Telegram обычно общий для бота
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                await asyncio.sleep(retry_after)
@@ -0,0 +1,193 @@
+# registration_state.py
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram import ReplyKeyboardMarkup, Update
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes, ConversationHandler
+
+from persistence import json_type
+from rate_limiter import BULK
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд бездействия незавершённая регистрация сбрасывается
+REGISTRATION_TIMEOUT = float(os.environ.get("REGISTRATION_TIMEOUT", 3600))
+# Как часто искать такие регистрации, секунд
+REGISTRATION_SWEEP_INTERVAL = float(os.environ.get("REGISTRATION_SWEEP_INTERVAL", 60))
+
+# Ключ состояния регистрации в context.user_data
+REGISTRATION_KEY = 'registration'
+# Ключи user_data прежней версии диалога: удаляются при первом проходе очистки
+LEGACY_KEYS = ('team_name', 'captain_nickname', 'players_data', 'subscription_message', 'captain_contact')
+
+TIMEOUT_MESSAGE = (
+    "⌛ Регистрация прервана: вы долго не отвечали. "
+    "Чтобы начать заново, нажмите «Регистрация»."
+)
+
+
+@json_type
+class RegistrationState:
+    """Данные незавершённой регистрации команды.
+
+    Игроки хранятся кортежами (никнейм, юзернейм, telegram_id), капитан — первым;
+    списки словарей для проверки подписки и записи в базу собираются по запросу.
+    updated_at — время последнего сообщения пользователя (time.time()), по нему
+    RegistrationSweeper находит брошенные регистрации.
+    """
+
+    __slots__ = ('team_name', 'captain_nickname', 'players', 'updated_at')
+
+    def __init__(self, team_name: Optional[str] = None, captain_nickname: Optional[str] = None,
+                 players: Tuple[Tuple[str, str, Optional[int]], ...] = (), updated_at: Optional[float] = None):
+        self.team_name = team_name
+        self.captain_nickname = captain_nickname
+        self.players = players
+        self.updated_at = time.time() if updated_at is None else updated_at
+
+    def touch(self):
+        self.updated_at = time.time()
+
+    def set_players(self, players_data: List[Dict]):
+        self.players = tuple((player['nickname'], player['username'], player['telegram_id']) for player in players_data)
+
+    def players_data(self) -> List[Dict]:
+        return [
+            {'nickname': nickname, 'username': username, 'telegram_id': telegram_id, 'is_captain': index == 0}
+            for index, (nickname, username, telegram_id) in enumerate(self.players)
+        ]
+
+    def to_json(self) -> list:
+        return [self.team_name, self.captain_nickname, self.players, self.updated_at]
+
+    @classmethod
+    def from_json(cls, value: list) -> 'RegistrationState':
+        team_name, captain_nickname, players, updated_at = value
+        return cls(team_name, captain_nickname, tuple(map(tuple, players)), updated_at)
+
+
+def get_registration(context: ContextTypes.DEFAULT_TYPE) -> RegistrationState:
+    """Состояние регистрации пользователя; создаётся, если его ещё нет."""
+    state = context.user_data.get(REGISTRATION_KEY)
+    if state is None:
+        state = context.user_data[REGISTRATION_KEY] = RegistrationState()
+    return state
+
+
+def clear_registration(context: ContextTypes.DEFAULT_TYPE) -> Optional[RegistrationState]:
+    """Убирает состояние регистрации из user_data и возвращает его."""
+    return context.user_data.pop(REGISTRATION_KEY, None)
+
+
+async def touch_registration(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отмечает активность пользователя с незавершённой регистрацией (обработчик группы -1)."""
+    if update.effective_user is None:
+        return
+    # application.user_data не создаёт записей для пользователей без данных, в отличие от context.user_data
+    user_data = context.application.user_data.get(update.effective_user.id)
+    state = user_data.get(REGISTRATION_KEY) if user_data else None
+    if state is not None:
+        state.touch()
+
+
+class RegistrationSweeper:
+    """Сбрасывает регистрации, брошенные дольше timeout назад.
+
+    run запускается из JobQueue: удаляет состояние из user_data (запись в базе
+    обновит SQLitePersistence), завершает диалог в ConversationHandler и отправляет
+    пользователю главное меню. conversation_timeout не используется: он заводит задачу
+    JobQueue на каждый диалог и не переживает перезапуск бота.
+
+    Диалог завершается приватным ConversationHandler._update_state — тем же методом, что
+    и встроенный conversation_timeout; версия python-telegram-bot закреплена в requirements.txt.
+    """
+
+    def __init__(self, conversation: ConversationHandler, reply_markup: ReplyKeyboardMarkup,
+                 timeout: float = REGISTRATION_TIMEOUT):
+        if conversation.per_message:
+            raise ValueError("RegistrationSweeper does not support per_message conversations")
+        # Лучше не запуститься, чем молча перестать завершать диалоги после обновления библиотеки
+        if not callable(getattr(conversation, '_update_state', None)):
+            raise RuntimeError("ConversationHandler._update_state is missing, check the python-telegram-bot version")
+        self.conversation = conversation
+        self.reply_markup = reply_markup
+        self.timeout = timeout
+        self._legacy_dropped = False
+        # Метрики
+        self.evicted = 0
+        self.active = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {'evicted': self.evicted, 'active': self.active}
+
+    def conversation_key(self, user_id: int) -> Tuple[int, ...]:
+        """Ключ диалога пользователя по правилам ConversationHandler._get_key.
+
+        Регистрация идёт в личном чате, где id чата совпадает с id пользователя.
+        """
+        key = []
+        if self.conversation.per_chat:
+            key.append(user_id)
+        if self.conversation.per_user:
+            key.append(user_id)
+        return tuple(key)
+
+    def drop_legacy_keys(self, application):
+        """Удаляет данные прежней версии диалога (их загружает persistence при первом запуске)."""
+        for user_id, user_data in list(application.user_data.items()):
+            legacy = [key for key in LEGACY_KEYS if key in user_data]
+            if not legacy:
+                continue
+            for key in legacy:
+                del user_data[key]
+            self._save(application, user_id, user_data)
+
+    def evict_expired(self, application, now: float) -> List[int]:
+        """Убирает просроченные регистрации и возвращает id их пользователей."""
+        if not self._legacy_dropped:
+            self.drop_legacy_keys(application)
+            self._legacy_dropped = True
+
+        cutoff = now - self.timeout
+        expired = []
+        active = 0
+        all_user_data = application.user_data
+        # Копируем только ключи: список пар (user_id, данные) на каждый проход заставляет сборщик
+        # мусора обходить всю кучу
+        for user_id in list(all_user_data):
+            user_data = all_user_data[user_id]
+            state = user_data.get(REGISTRATION_KEY)
+            if state is None:
+                continue
+            if state.updated_at > cutoff:
+                active += 1
+                continue
+            del user_data[REGISTRATION_KEY]
+            self.conversation._update_state(ConversationHandler.END, self.conversation_key(user_id))
+            self._save(application, user_id, user_data)
+            expired.append(user_id)
+        self.active = active
+        self.evicted += len(expired)
+        return expired
+
+    @staticmethod
+    def _save(application, user_id: int, user_data: dict):
+        if user_data:
+            application.mark_data_for_update_persistence(user_ids=user_id)
+        else:
+            application.drop_user_data(user_id)
+
+    async def run(self, context: ContextTypes.DEFAULT_TYPE):
+        expired = self.evict_expired(context.application, time.time())
+        if expired:
+            logger.info(f"Evicted {len(expired)} abandoned registrations")
+        for user_id in expired:
+            try:
+                await context.bot.send_message(
+                    chat_id=user_id, text=TIMEOUT_MESSAGE, reply_markup=self.reply_markup, rate_limit_args=BULK
+                )
+            except TelegramError as e:
+                logger.warning(f"Could not notify user {user_id} about registration timeout: {e}")
@@ -6,7 +6,7 @@ async def check_registration_status(update: Update, context: ContextTypes.DEFAUL
     """Check registration status by user's Telegram ID."""
     telegram_id = update.message.from_user.id
 
-    team = context.bot_data['db'].get_team_by_telegram_id(telegram_id)
+    team = await context.bot_data['db'].get_team_by_telegram_id(telegram_id)
 
     if team:
         # Переводим статус на русский язык
@@ -0,0 +1,115 @@
+# reverification.py
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List
+
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+
+from async_database import AsyncDatabase
+from rate_limiter import BULK
+from subscription import CHANNEL_ID, CHECK_FAILED, NOT_FOUND, api_busy, verify_player
+from username_cache import UsernameCache
+
+logger = logging.getLogger(__name__)
+
+# Раз в сколько секунд проверяется очередная партия игроков
+SWEEP_INTERVAL = float(os.environ.get("SWEEP_INTERVAL", 30))
+# Игроков в одной партии и сколько из них проверяется одновременно
+SWEEP_BATCH_SIZE = int(os.environ.get("SWEEP_BATCH_SIZE", 20))
+SWEEP_CONCURRENCY = int(os.environ.get("SWEEP_CONCURRENCY", 2))
+# Пауза между полными проходами по всем игрокам, секунд
+SWEEP_CYCLE_PAUSE = float(os.environ.get("SWEEP_CYCLE_PAUSE", 6 * 3600))
+
+CHECKPOINT_NAME = "subscription_sweep"
+
+# Сколько команд показывать в сводке (сообщение Telegram ограничено 4096 символами)
+DIGEST_MAX_TEAMS = 30
+
+STATUS_LABELS = {
+    'pending': "ожидает",
+    'approved': "одобрена",
+}
+
+
+class SubscriptionSweeper:
+    """Фоновая перепроверка подписки игроков ожидающих и одобренных команд.
+
+    run_batch запускается из JobQueue и за раз проверяет небольшую партию игроков
+    по возрастанию id; позиция хранится в job_checkpoints, поэтому после перезапуска
+    проход продолжается с того же места. Партия пропускается, если все слоты общего
+    лимита запросов заняты интерактивными проверками. По окончании прохода администраторы
+    получают одну сводку о командах, в которых игроки перестали проходить проверку.
+    """
+
+    def __init__(self, db: AsyncDatabase, userbot, cache: UsernameCache, subscribers,
+                 batch_size: int = SWEEP_BATCH_SIZE, concurrency: int = SWEEP_CONCURRENCY,
+                 cycle_pause: float = SWEEP_CYCLE_PAUSE):
+        self.db = db
+        self.userbot = userbot
+        self.cache = cache
+        self.subscribers = subscribers
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.cycle_pause = cycle_pause
+        # Метрики
+        self.checked = 0
+        self.failed = 0
+        self.skipped_batches = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {'checked': self.checked, 'failed': self.failed, 'skipped_batches': self.skipped_batches}
+
+    async def run_batch(self, context: ContextTypes.DEFAULT_TYPE):
+        checkpoint = await self.db.get_checkpoint(CHECKPOINT_NAME)
+        position, cycle_started_at = checkpoint if checkpoint else (0, time.time())
+        if time.time() < cycle_started_at:
+            # Пауза между проходами ещё не закончилась
+            return
+        if api_busy():
+            self.skipped_batches += 1
+            return
+
+        players = await self.db.get_players_to_verify(position, self.batch_size)
+        if players:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def bounded(player: dict) -> str:
+                async with semaphore:
+                    return await verify_player(context.bot, self.userbot, player, self.cache, self.subscribers)
+
+            results = await asyncio.gather(*(bounded(player) for player in players))
+            # Неудавшиеся проверки не записываем: прежний результат остаётся, игрок проверится в следующем проходе
+            rows = [
+                (player['id'], player['team_id'], player['telegram_id'], result)
+                for player, result in zip(players, results) if result != CHECK_FAILED
+            ]
+            self.checked += len(rows)
+            self.failed += len(players) - len(rows)
+            await self.db.save_verification_batch(CHECKPOINT_NAME, rows, time.time(), players[-1]['id'], cycle_started_at)
+
+        if len(players) < self.batch_size:
+            teams = await self.db.get_noncompliant_teams(cycle_started_at)
+            if teams:
+                await self.send_digest(context.bot, teams)
+            logger.info(f"Subscription sweep finished, {len(teams)} teams out of compliance")
+            await self.db.save_verification_batch(CHECKPOINT_NAME, [], time.time(), 0, time.time() + self.cycle_pause)
+
+    async def send_digest(self, bot, teams: List[dict]):
+        lines = [f"🔔 Перепроверка подписки на {CHANNEL_ID}: в этих командах есть игроки, которые больше не проходят проверку\n"]
+        for team in teams[:DIGEST_MAX_TEAMS]:
+            lines.append(f"🎮 {team['team_name']} (ID {team['id']}, {STATUS_LABELS.get(team['status'], team['status'])})")
+            for nickname, username, result in team['players']:
+                reason = "аккаунт не найден" if result == NOT_FOUND else "не подписан"
+                lines.append(f"  • {nickname} – @{username} ({reason})")
+        if len(teams) > DIGEST_MAX_TEAMS:
+            lines.append(f"\n…и ещё {len(teams) - DIGEST_MAX_TEAMS} команд")
+        text = "\n".join(lines)[:4096]
+
+        for admin_id in await self.db.get_admin_ids():
+            try:
+                await bot.send_message(chat_id=admin_id, text=text, rate_limit_args=BULK)
+            except TelegramError as e:
+                logger.warning(f"Could not send sweep digest to admin {admin_id}: {e}")
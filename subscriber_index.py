@@ -0,0 +1,60 @@
+# subscriber_index.py
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from async_database import AsyncDatabase
+from subscription import CHANNEL_ID
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд запись индекса считается актуальной без повторной проверки через API
+SUBSCRIBER_STALE_SECONDS = float(os.environ.get("SUBSCRIBER_STALE_SECONDS", 6 * 3600))
+
+
+class SubscriberIndex:
+    """Локальный индекс подписчиков канала: user_id → (статус, время подтверждения).
+
+    Пополняется из обновлений chat_member и из живых проверок get_chat_member,
+    хранится в памяти и в таблице channel_members.
+    """
+
+    def __init__(self, db: AsyncDatabase, stale_after: float = SUBSCRIBER_STALE_SECONDS):
+        self.db = db
+        self.stale_after = stale_after
+        self._members: Dict[int, Tuple[str, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        """Загружает из SQLite записи, которые ещё не устарели."""
+        for user_id, status, updated_at in await self.db.get_channel_members(time.time() - self.stale_after):
+            self._members[user_id] = (status, updated_at)
+        logger.info(f"Loaded {len(self._members)} channel members into subscriber index")
+
+    def get(self, user_id: int) -> Optional[str]:
+        """Статус из индекса или None, если пользователь неизвестен или запись устарела."""
+        entry = self._members.get(user_id)
+        if entry is None or time.time() - entry[1] >= self.stale_after:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    async def update(self, user_id: int, status: str):
+        updated_at = time.time()
+        self._members[user_id] = (status, updated_at)
+        await self.db.save_channel_member(user_id, status, updated_at)
+
+
+async def track_channel_member(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обновляет индекс подписчиков по событиям chat_member канала."""
+    member_update = update.chat_member
+    if member_update.chat.username is None or member_update.chat.username.lower() != CHANNEL_ID.lstrip('@').lower():
+        return
+    member = member_update.new_chat_member
+    await context.bot_data['subscribers'].update(member.user.id, member.status)
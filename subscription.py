@@ -0,0 +1,135 @@
+# subscription.py
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, List, Dict, Optional
+
+from pyrogram.errors import UsernameNotOccupied, UsernameInvalid
+
+from metrics import CLIENT_LATENCY, CLIENT_ERRORS
+from username_cache import UsernameCache
+
+logger = logging.getLogger(__name__)
+
+# Channel ID for subscription check
+CHANNEL_ID = "@m5cup"
+
+# Статусы участника канала, которые считаются подпиской
+SUBSCRIBED_STATUSES = ('member', 'administrator', 'creator')
+
+# Общий лимит одновременных запросов к Telegram для всех пользователей бота
+API_CONCURRENCY = int(os.environ.get("API_CONCURRENCY", 16))
+# Сколько игроков одного состава проверяется одновременно
+ROSTER_CONCURRENCY = int(os.environ.get("ROSTER_CONCURRENCY", 4))
+# Таймаут одного запроса к API, секунд
+API_TIMEOUT = float(os.environ.get("API_TIMEOUT", 10))
+
+# Результаты проверки игрока
+SUBSCRIBED = 'subscribed'
+NOT_SUBSCRIBED = 'not_subscribed'
+CHECK_FAILED = 'check_failed'
+NOT_FOUND = 'not_found'
+
+_api_semaphore = asyncio.Semaphore(API_CONCURRENCY)
+
+
+def api_busy() -> bool:
+    """Заняты ли все слоты общего лимита запросов (обычно — интерактивными проверками)."""
+    return _api_semaphore.locked()
+
+
+async def call_api(func, *args, **kwargs):
+    """Выполняет запрос к API под общим лимитом параллельности и с таймаутом."""
+    name = func.__name__
+    started = time.perf_counter()
+    try:
+        async with _api_semaphore:
+            return await asyncio.wait_for(func(*args, **kwargs), timeout=API_TIMEOUT)
+    except Exception:
+        CLIENT_ERRORS.labels(name).inc()
+        raise
+    finally:
+        CLIENT_LATENCY.labels(name).observe(time.perf_counter() - started)
+
+
+async def get_tg_id_by_username(userbot, username: str, cache: Optional[UsernameCache] = None) -> Optional[int]:
+    """Gets Telegram ID by username using Pyrogram.
+
+    Возвращает None, если такого пользователя нет; остальные ошибки пробрасываются
+    и в кэш не попадают.
+    """
+    if cache is not None:
+        found, telegram_id = await cache.get(username)
+        if found:
+            return telegram_id
+
+    try:
+        users = await call_api(userbot.get_users, username)
+    except (UsernameNotOccupied, UsernameInvalid):
+        users = None
+    if isinstance(users, list):
+        telegram_id = users[0].id if users else None
+    else:
+        telegram_id = users.id if users else None
+
+    if cache is not None:
+        await cache.set(username, telegram_id)
+    return telegram_id
+
+
+async def get_member_status(bot, user_id: int, subscribers=None) -> str:
+    """Статус пользователя в канале (member, left, kicked, ...).
+
+    Если передан индекс подписчиков (SubscriberIndex), сначала используется он, но только
+    для подписок: пользователь мог подписаться после записи 'left', а обновление chat_member
+    приходит, лишь если бот — администратор канала. Отказ всегда перепроверяется через API.
+    """
+    if subscribers is not None:
+        status = subscribers.get(user_id)
+        if status in SUBSCRIBED_STATUSES:
+            return status
+
+    chat_member = await call_api(bot.get_chat_member, chat_id=CHANNEL_ID, user_id=user_id)
+    if subscribers is not None:
+        await subscribers.update(user_id, chat_member.status)
+    return chat_member.status
+
+
+async def verify_player(bot, userbot, player: Dict, cache: Optional[UsernameCache] = None,
+                        subscribers=None) -> str:
+    """Определяет telegram_id игрока (если он ещё не известен) и проверяет подписку на канал."""
+    if player['telegram_id'] is None:
+        try:
+            player['telegram_id'] = await get_tg_id_by_username(userbot, player['username'], cache)
+        except Exception as e:
+            logger.error(f"Error getting Telegram ID for {player['username']}: {e!r}")
+            return CHECK_FAILED
+        if player['telegram_id'] is None:
+            return NOT_FOUND
+
+    try:
+        status = await get_member_status(bot, player['telegram_id'], subscribers)
+    except Exception as e:
+        logger.error(f"Error checking subscription for user {player['telegram_id']} (Bot API): {e!r}")
+        return CHECK_FAILED
+    return SUBSCRIBED if status in SUBSCRIBED_STATUSES else NOT_SUBSCRIBED
+
+
+async def verify_players(bot, userbot, players: List[Dict], cache: Optional[UsernameCache] = None,
+                         subscribers=None, on_result: Optional[Callable[[int, str], None]] = None) -> List[str]:
+    """Проверяет игроков состава параллельно; результаты идут в порядке состава.
+
+    on_result(индекс игрока, результат) вызывается сразу по завершении каждой проверки,
+    не дожидаясь остальных.
+    """
+    roster_semaphore = asyncio.Semaphore(ROSTER_CONCURRENCY)
+
+    async def bounded(index: int, player: Dict) -> str:
+        async with roster_semaphore:
+            result = await verify_player(bot, userbot, player, cache, subscribers)
+        if on_result is not None:
+            on_result(index, result)
+        return result
+
+    return await asyncio.gather(*(bounded(index, player) for index, player in enumerate(players)))
@@ -0,0 +1,90 @@
+# team_cache.py
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+# Сколько пользователей и команд держать в памяти
+TEAM_CACHE_SIZE = int(os.environ.get("TEAM_CACHE_SIZE", 10000))
+# Время жизни записи, секунд: страховка на случай изменений базы другим процессом
+TEAM_CACHE_TTL = float(os.environ.get("TEAM_CACHE_TTL", 300))
+
+
+class TeamCache:
+    """LRU-кэш команды пользователя для «Проверить статус регистрации».
+
+    Два уровня: telegram_id → id команды (или None, если команды нет) и id команды → данные.
+    Игроки одной команды разделяют одну запись команды, поэтому смена статуса сбрасывает
+    ровно одну запись. Сбросы вызывает AsyncDatabase после каждой записи, которая меняет
+    данные команд; счётчик generation не даёт чтению, начатому до сброса, вернуть в кэш
+    устаревшие данные.
+    """
+
+    def __init__(self, max_size: int = TEAM_CACHE_SIZE, ttl: float = TEAM_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # telegram_id -> (id команды или None, время записи)
+        self._team_ids: "OrderedDict[int, Tuple[Optional[int], float]]" = OrderedDict()
+        # id команды -> (данные команды, время записи)
+        self._teams: "OrderedDict[int, Tuple[dict, float]]" = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int) -> Tuple[bool, Optional[dict]]:
+        """Возвращает (найдено ли в кэше, команда или None)."""
+        now = time.monotonic()
+        entry = self._team_ids.get(telegram_id)
+        if entry is not None and now - entry[1] < self.ttl:
+            team_id = entry[0]
+            if team_id is None:
+                self._team_ids.move_to_end(telegram_id)
+                self.hits += 1
+                return True, None
+            team = self._teams.get(team_id)
+            if team is not None and now - team[1] < self.ttl:
+                self._team_ids.move_to_end(telegram_id)
+                self._teams.move_to_end(team_id)
+                self.hits += 1
+                return True, team[0]
+        self.misses += 1
+        return False, None
+
+    def put(self, telegram_id: int, team: Optional[dict], generation: int):
+        """Запоминает результат чтения, если с его начала (generation) ничего не сбрасывалось."""
+        if generation != self.generation:
+            return
+        now = time.monotonic()
+        team_id = team['id'] if team is not None else None
+        self._team_ids[telegram_id] = (team_id, now)
+        self._team_ids.move_to_end(telegram_id)
+        if team is not None:
+            self._teams[team_id] = (team, now)
+            self._teams.move_to_end(team_id)
+        while len(self._team_ids) > self.max_size:
+            self._team_ids.popitem(last=False)
+        while len(self._teams) > self.max_size:
+            self._teams.popitem(last=False)
+
+    def invalidate_teams(self, team_ids: Iterable[int]):
+        self.generation += 1
+        for team_id in team_ids:
+            self._teams.pop(team_id, None)
+
+    def invalidate_status(self, status: str):
+        """Сбрасывает все команды со статусом status (массовая смена статуса без списка id)."""
+        self.generation += 1
+        for team_id in [team_id for team_id, (team, _) in self._teams.items() if team['status'] == status]:
+            del self._teams[team_id]
+
+    def invalidate_users(self, telegram_ids: Iterable[Optional[int]]):
+        """Сбрасывает соответствия пользователей, которые могли появиться в составе команды."""
+        self.generation += 1
+        for telegram_id in telegram_ids:
+            if telegram_id is not None:
+                self._team_ids.pop(telegram_id, None)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,60 @@
+# tests/test_admin_handlers.py
+import asyncio
+from types import SimpleNamespace
+
+from admin_handlers import ADMIN_TEAMS_PAGE_SIZE, MESSAGE_LIMIT, shorten, show_teams_page, utf16_len
+
+
+class FakeDatabase:
+    def __init__(self, teams):
+        self.teams = teams
+
+    async def get_teams_page(self, status=None, limit=None, after_id=None, before_id=None):
+        return self.teams, False
+
+
+class FakeQuery:
+    def __init__(self):
+        self.texts = []
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.texts.append(text)
+
+
+def verbose_team(team_id: int, filler: str) -> dict:
+    return {
+        'id': team_id,
+        'team_name': filler * 300,
+        'registration_date': '2024-01-01',
+        'captain_contact': filler * 4096,
+        'status': 'pending',
+        'admin_comment': filler * 1000,
+        'players': [(filler * 100, filler * 100, i) for i in range(50)],
+    }
+
+
+def render_page(teams) -> str:
+    query = FakeQuery()
+    context = SimpleNamespace(bot_data={'db': FakeDatabase(teams)}, user_data={})
+    asyncio.run(show_teams_page(query, context))
+    return query.texts[-1]
+
+
+def test_verbose_page_fits_message_limit():
+    for filler in ("x", "🔥"):
+        text = render_page([verbose_team(i, filler) for i in range(1, ADMIN_TEAMS_PAGE_SIZE + 1)])
+        assert utf16_len(text) <= MESSAGE_LIMIT
+        # Каждая команда осталась на странице
+        assert all(f"{number}. 🎮" in text for number in range(1, ADMIN_TEAMS_PAGE_SIZE + 1))
+
+
+def test_short_page_is_not_truncated():
+    team = {'id': 1, 'team_name': 'Alpha', 'registration_date': '2024-01-01', 'captain_contact': '@captain',
+            'status': 'pending', 'admin_comment': None, 'players': [('Player', 'player', 1)]}
+    text = render_page([team])
+    assert "Alpha" in text and "@captain" in text and "…" not in text
+
+
+def test_shorten_counts_utf16_units():
+    assert shorten("🔥" * 10, 5) == "🔥🔥…"
+    assert shorten("abc", 3) == "abc"
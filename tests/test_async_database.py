@@ -0,0 +1,55 @@
+# tests/test_async_database.py
+import asyncio
+import os
+
+from async_database import AsyncDatabase
+from database import Database
+
+
+def player(i: int) -> dict:
+    return {'nickname': f'Player{i}', 'username': f'player{i}', 'telegram_id': 1000 + i, 'is_captain': True}
+
+
+def test_aclose_commits_pending_writes(tmp_path):
+    path = os.path.join(tmp_path, 'test.db')
+
+    async def scenario():
+        db = AsyncDatabase(Database(path))
+        # Записи ещё ждут окна group commit, когда приложение начинает останавливаться
+        writes = [asyncio.ensure_future(db.register_team(f'Team {i}', [player(i)], '@captain')) for i in range(20)]
+        await asyncio.sleep(0)
+        assert db._pending_writes
+        await db.aclose()
+        return await asyncio.wait_for(asyncio.gather(*writes), timeout=1)
+
+    team_ids = asyncio.run(scenario())
+    assert len(set(team_ids)) == 20
+
+    db = Database(path)
+    assert db.get_stats()['teams_total'] == 20
+    db.close()
+
+
+def test_bad_operation_does_not_fail_its_batch(tmp_path):
+    path = os.path.join(tmp_path, 'test.db')
+    bad_player = {'nickname': 'Broken', 'username': 'broken', 'telegram_id': 1}  # без is_captain
+
+    async def scenario():
+        db = AsyncDatabase(Database(path))
+        # Обе записи попадают в одну транзакцию group commit
+        results = await asyncio.gather(
+            db.register_team('Good', [player(1)], '@captain'),
+            db.register_team('Bad', [bad_player], '@captain'),
+            return_exceptions=True
+        )
+        await db.aclose()
+        return results
+
+    good, bad = asyncio.run(scenario())
+    assert isinstance(good, int)
+    assert isinstance(bad, KeyError)
+
+    db = Database(path)
+    assert [row[0] for row in db._connection().execute('SELECT team_name FROM teams')] == ['Good']
+    assert db._connection().execute('SELECT COUNT(*) FROM players').fetchone()[0] == 1
+    db.close()
@@ -0,0 +1,63 @@
+# tests/test_database.py
+import os
+import sqlite3
+
+import pytest
+
+from database import MIGRATIONS, Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(os.path.join(tmp_path, 'test.db'))
+    yield db
+    db.close()
+
+
+def test_registered_player_found_by_telegram_id_after_username_change(db):
+    db.register_team('Team', [
+        {'nickname': 'Player', 'username': 'old_name', 'telegram_id': 777, 'is_captain': False},
+    ], '@captain')
+
+    assert db.find_registered_players([], ['new_name']) == []
+    registered = db.find_registered_players([777], [])
+    assert [(player['telegram_id'], player['team_name']) for player in registered] == [(777, 'Team')]
+
+
+def test_rejected_teams_do_not_block_players(db):
+    team_id = db.register_team('Team', [
+        {'nickname': 'Player', 'username': 'player', 'telegram_id': 777, 'is_captain': False},
+    ], '@captain')
+    db.update_team_status(team_id, 'rejected')
+
+    assert db.find_registered_players([777], ['player']) == []
+
+
+def test_baseline_database_with_duplicate_names_is_migrated(tmp_path):
+    path = os.path.join(tmp_path, 'baseline.db')
+    # Схема исходной версии бота (user_version = 0) и одинаковые без учёта регистра названия,
+    # которые она допускала
+    conn = sqlite3.connect(path)
+    for statement in MIGRATIONS[0]:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT INTO teams (team_name, captain_contact, registration_date) VALUES (?, '@captain', '2024-01-01')",
+        [('Alpha',), ('alpha',), ('Beta',), ('ALPHA',)]
+    )
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    try:
+        names = [row[0] for row in db._connection().execute('SELECT team_name FROM teams ORDER BY id')]
+        assert names == ['Alpha', 'alpha (2)', 'Beta', 'ALPHA (4)']
+        assert db.team_name_exists('ALPHA')
+        assert db._connection().execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+    finally:
+        db.close()
+
+
+def test_old_sqlite_is_reported_before_migrating(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite3, 'sqlite_version_info', (3, 31, 1))
+    with pytest.raises(RuntimeError, match='3.34.0'):
+        Database(os.path.join(tmp_path, 'old.db'))
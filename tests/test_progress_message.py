@@ -0,0 +1,60 @@
+# tests/test_progress_message.py
+import asyncio
+
+from progress_message import ProgressMessage
+
+
+class SlowMessage:
+    """Сообщение, правка которого занимает latency секунд; хранит показанные тексты."""
+
+    chat_id = 1
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.text = "start"
+        self.shown = []
+
+    async def edit_text(self, text: str):
+        await asyncio.sleep(self.latency)
+        self.shown.append(text)
+
+
+def test_close_delivers_last_text_when_edit_in_flight():
+    async def scenario():
+        message = SlowMessage(latency=0.05)
+        progress = ProgressMessage(message, interval=0.02)
+        progress.update("1/2")
+        await asyncio.sleep(0.03)
+        # Правка «1/2» ещё идёт, последний результат приходит после окна паузы
+        progress.update("завершена")
+        await asyncio.sleep(0.03)
+        await progress.close()
+        return message.shown
+
+    assert asyncio.run(scenario())[-1] == "завершена"
+
+
+def test_close_during_pause_sends_final_text_once():
+    async def scenario():
+        message = SlowMessage(latency=0.01)
+        progress = ProgressMessage(message, interval=10)
+        progress.update("1/3")
+        await asyncio.sleep(0.02)
+        progress.update("2/3")
+        progress.update("завершена")
+        await progress.close()
+        return message.shown
+
+    assert asyncio.run(scenario()) == ["1/3", "завершена"]
+
+
+def test_close_waits_for_edit_in_flight():
+    async def scenario():
+        message = SlowMessage(latency=0.05)
+        progress = ProgressMessage(message, interval=0)
+        progress.update("1/1")
+        await asyncio.sleep(0)
+        await progress.close()
+        return message.shown
+
+    assert asyncio.run(scenario()) == ["1/1"]
@@ -0,0 +1,63 @@
+# tests/test_query_plans.py
+# Частые запросы должны идти по индексам из миграций: план снимается с тех SQL,
+# которые на самом деле выполняют методы Database.
+import os
+import re
+
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(os.path.join(tmp_path, 'test.db'))
+    for i in range(1, 4):
+        db.register_team(f'Team {i}', [
+            {'nickname': f'Player{i}', 'username': f'player{i}', 'telegram_id': 1000 + i, 'is_captain': True}
+        ], f'@captain{i}')
+    yield db
+    db.close()
+
+
+def query_plan(db: Database, call) -> str:
+    """EXPLAIN QUERY PLAN всех SELECT, которые выполнил call()."""
+    statements = []
+    conn = db._connection()
+    # sqlite3 передаёт в трассировку текст запроса с подставленными параметрами
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    selects = [sql for sql in statements if sql.lstrip().upper().startswith(('SELECT', 'WITH'))]
+    assert selects, "call() не выполнил ни одного SELECT"
+    return "\n".join(row[3] for sql in selects for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"))
+
+
+def assert_uses_index(plan: str, index: str):
+    assert re.search(rf"USING (COVERING )?INDEX {index}\b", plan), plan
+
+
+def test_team_name_lookup_uses_index(db):
+    assert_uses_index(query_plan(db, lambda: db.team_name_exists('team 2')), 'idx_teams_team_name')
+
+
+def test_team_by_telegram_id_uses_indexes(db):
+    plan = query_plan(db, lambda: db.get_team_by_telegram_id(1002))
+    assert_uses_index(plan, 'idx_players_telegram_id')
+    assert_uses_index(plan, 'idx_players_team_id')
+
+
+def test_registered_players_lookup_uses_indexes(db):
+    plan = query_plan(db, lambda: db.find_registered_players([1001], ['PLAYER2']))
+    assert_uses_index(plan, 'idx_players_telegram_id')
+    assert_uses_index(plan, 'idx_players_telegram_username')
+
+
+def test_teams_by_status_use_index(db):
+    assert_uses_index(query_plan(db, lambda: db.get_teams_page('pending')), 'idx_teams_status_date')
+
+
+def test_teams_page_without_status_uses_index(db):
+    assert_uses_index(query_plan(db, lambda: db.get_teams_page()), 'idx_teams_registration_date')
@@ -0,0 +1,86 @@
+# tests/test_registration_state.py
+import time
+
+import pytest
+from telegram import Chat, Message, Update, User
+from telegram.ext import ConversationHandler
+
+from persistence import _decode, _encode
+from registration_state import REGISTRATION_KEY, RegistrationState, RegistrationSweeper
+
+TIMEOUT = 60
+IN_PROGRESS = 1
+
+
+class FakeApplication:
+    """То, что RegistrationSweeper использует из Application."""
+
+    def __init__(self, user_data: dict):
+        self.user_data = user_data
+        self.updated = set()
+        self.dropped = set()
+
+    def mark_data_for_update_persistence(self, user_ids):
+        self.updated.add(user_ids)
+
+    def drop_user_data(self, user_id: int):
+        self.user_data.pop(user_id, None)
+        self.dropped.add(user_id)
+
+
+def private_update(user_id: int) -> Update:
+    user = User(id=user_id, first_name='Captain', is_bot=False)
+    chat = Chat(id=user_id, type=Chat.PRIVATE)
+    return Update(1, message=Message(1, date=None, chat=chat, from_user=user, text='Назад'))
+
+
+def conversation(**kwargs) -> ConversationHandler:
+    return ConversationHandler(entry_points=[], states={}, fallbacks=[], **kwargs)
+
+
+@pytest.mark.parametrize('per_chat, per_user', [(True, True), (False, True), (True, False)])
+def test_conversation_key_matches_ptb(per_chat, per_user):
+    handler = conversation(per_chat=per_chat, per_user=per_user)
+    sweeper = RegistrationSweeper(handler, reply_markup=None, timeout=TIMEOUT)
+    assert sweeper.conversation_key(42) == handler._get_key(private_update(42))
+
+
+def test_expired_registration_is_evicted():
+    handler = conversation()
+    now = time.time()
+    for user_id in (1, 2, 3):
+        handler._conversations[handler._get_key(private_update(user_id))] = IN_PROGRESS
+    application = FakeApplication({
+        1: {REGISTRATION_KEY: RegistrationState(updated_at=now - TIMEOUT - 1)},
+        2: {REGISTRATION_KEY: RegistrationState(updated_at=now - TIMEOUT - 1), 'other': 1},
+        3: {REGISTRATION_KEY: RegistrationState(updated_at=now)},
+    })
+    sweeper = RegistrationSweeper(handler, reply_markup=None, timeout=TIMEOUT)
+
+    assert sweeper.evict_expired(application, now) == [1, 2]
+    assert list(handler._conversations) == [handler._get_key(private_update(3))]
+    assert application.dropped == {1}
+    assert application.user_data[2] == {'other': 1} and 2 in application.updated
+    assert REGISTRATION_KEY in application.user_data[3]
+    assert sweeper.stats() == {'evicted': 2, 'active': 1}
+
+
+def test_legacy_keys_are_dropped_once():
+    application = FakeApplication({1: {'team_name': 'Team', 'players_data': []}})
+    sweeper = RegistrationSweeper(conversation(), reply_markup=None, timeout=TIMEOUT)
+
+    assert sweeper.evict_expired(application, time.time()) == []
+    assert 1 not in application.user_data
+
+
+def test_per_message_conversations_are_rejected():
+    with pytest.raises(ValueError):
+        RegistrationSweeper(conversation(per_message=True, per_chat=True), reply_markup=None)
+
+
+def test_state_survives_persistence_round_trip():
+    state = RegistrationState('Team', 'Captain', (('Captain', 'captain', 1), ('Player', 'player', None)), 123.0)
+    restored = _decode(_encode({REGISTRATION_KEY: state}))[REGISTRATION_KEY]
+    assert isinstance(restored, RegistrationState)
+    assert restored.to_json() == state.to_json()
+    assert restored.players_data()[0]['is_captain'] and not restored.players_data()[1]['is_captain']
@@ -0,0 +1,40 @@
+# tests/test_subscription.py
+import asyncio
+from types import SimpleNamespace
+
+from subscription import get_member_status
+
+
+class FakeIndex:
+    def __init__(self, status):
+        self.status = status
+        self.updated = []
+
+    def get(self, user_id):
+        return self.status
+
+    async def update(self, user_id, status):
+        self.updated.append((user_id, status))
+
+
+class FakeBot:
+    def __init__(self, status):
+        self.status = status
+        self.calls = 0
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls += 1
+        return SimpleNamespace(status=self.status)
+
+
+def test_subscribed_status_comes_from_index():
+    bot = FakeBot('left')
+    assert asyncio.run(get_member_status(bot, 1, FakeIndex('member'))) == 'member'
+    assert bot.calls == 0
+
+
+def test_negative_status_is_rechecked_live():
+    bot, index = FakeBot('member'), FakeIndex('left')
+    assert asyncio.run(get_member_status(bot, 1, index)) == 'member'
+    assert bot.calls == 1
+    assert index.updated == [(1, 'member')]
@@ -0,0 +1,135 @@
+# tests/test_webhook.py
+import asyncio
+import json
+from types import SimpleNamespace
+
+from webhook import WebhookServer
+
+SECRET = "test-secret"
+PATH = "/telegram"
+UPDATE = {"update_id": 1}
+
+
+async def post(port: int, body: bytes, secret=SECRET) -> int:
+    """Отправляет POST на вебхук и возвращает HTTP-статус ответа."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    headers = f"POST {PATH} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\nConnection: close\r\n"
+    if secret is not None:
+        headers += f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n"
+    writer.write(headers.encode() + b"\r\n" + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def send_raw(port: int, data: bytes) -> bytes:
+    """Отправляет байты как есть, закрывает запись и возвращает всё, что ответил сервер."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    writer.write_eof()
+    response = await asyncio.wait_for(reader.read(), 5)
+    writer.close()
+    return response
+
+
+def run_server(scenario, secret_token=SECRET, max_queue=10, read_timeout=10):
+    errors = []
+
+    async def main():
+        # Необработанные исключения в client_connected_cb попадают в обработчик цикла, а не в тест
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        application = SimpleNamespace(update_queue=asyncio.Queue(), bot=None)
+        server = WebhookServer(application, path=PATH, secret_token=secret_token, max_queue=max_queue,
+                               read_timeout=read_timeout)
+        await server.start("127.0.0.1", 0)
+        try:
+            return await scenario(server, application)
+        finally:
+            await server.stop()
+
+    result = asyncio.run(main())
+    assert errors == []
+    return result
+
+    return asyncio.run(main())
+
+
+def test_valid_update_is_queued():
+    async def scenario(server, application):
+        return await post(server.port, json.dumps(UPDATE).encode()), application.update_queue.qsize()
+
+    assert run_server(scenario) == (200, 1)
+
+
+def test_missing_or_wrong_secret_is_forbidden():
+    async def scenario(server, application):
+        body = json.dumps(UPDATE).encode()
+        return [await post(server.port, body, secret=None), await post(server.port, body, secret="wrong")]
+
+    assert run_server(scenario) == [403, 403]
+
+
+def test_secret_is_generated_when_not_configured():
+    async def scenario(server, application):
+        return server.secret_token, await post(server.port, json.dumps(UPDATE).encode(), secret=None)
+
+    secret, status = run_server(scenario, secret_token=None)
+    assert secret and status == 403
+
+
+def test_bad_json_and_non_object_body_are_rejected():
+    async def scenario(server, application):
+        return [await post(server.port, body) for body in (b"{not json", b"[]", b"1", b'{"message": 1}')]
+
+    assert run_server(scenario) == [400, 400, 400, 400]
+
+
+def test_full_queue_returns_503():
+    async def scenario(server, application):
+        application.update_queue.put_nowait(object())
+        return await post(server.port, json.dumps(UPDATE).encode())
+
+    assert run_server(scenario, max_queue=1) == 503
+
+
+def test_negative_content_length_is_rejected():
+    async def scenario(server, application):
+        request = (f"POST {PATH} HTTP/1.1\r\nContent-Length: -1\r\n"
+                   f"X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\n\r\n")
+        return await send_raw(server.port, request.encode())
+
+    assert run_server(scenario).startswith(b"HTTP/1.1 400 ")
+
+
+def test_truncated_body_closes_connection():
+    async def scenario(server, application):
+        request = (f"POST {PATH} HTTP/1.1\r\nContent-Length: 100\r\n"
+                   f"X-Telegram-Bot-Api-Secret-Token: {SECRET}\r\n\r\n{{}}")
+        return await send_raw(server.port, request.encode()), application.update_queue.qsize()
+
+    assert run_server(scenario) == (b"", 0)
+
+
+def test_unauthenticated_body_is_not_read():
+    async def scenario(server, application):
+        # Тело не отправлено вовсе: без секрета сервер отвечает, не дожидаясь его
+        request = f"POST {PATH} HTTP/1.1\r\nContent-Length: 100\r\n\r\n"
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(request.encode())
+        status_line = await asyncio.wait_for(reader.readline(), 5)
+        writer.close()
+        return status_line
+
+    assert run_server(scenario).startswith(b"HTTP/1.1 403 ")
+
+
+def test_slow_client_is_disconnected():
+    async def scenario(server, application):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(f"POST {PATH} HTTP/1.1\r\n".encode())
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return response
+
+    assert run_server(scenario, read_timeout=0.1) == b""
@@ -0,0 +1,79 @@
+# username_cache.py
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from async_database import AsyncDatabase
+
+# Размер LRU-кэша в памяти
+USERNAME_CACHE_SIZE = int(os.environ.get("USERNAME_CACHE_SIZE", 10000))
+# Время жизни найденного соответствия, секунд
+USERNAME_CACHE_TTL = float(os.environ.get("USERNAME_CACHE_TTL", 7 * 24 * 3600))
+# Время жизни отрицательного результата («пользователь не найден»), секунд
+USERNAME_NEGATIVE_TTL = float(os.environ.get("USERNAME_NEGATIVE_TTL", 600))
+
+
+class UsernameCache:
+    """Двухуровневый кэш username → telegram_id: LRU в памяти и таблица username_cache в SQLite.
+
+    Отрицательные результаты (None) тоже кэшируются, но на меньший срок.
+    """
+
+    def __init__(self, db: AsyncDatabase, max_size: int = USERNAME_CACHE_SIZE,
+                 ttl: float = USERNAME_CACHE_TTL, negative_ttl: float = USERNAME_NEGATIVE_TTL):
+        self.db = db
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # username -> (telegram_id, resolved_at)
+        self._entries: "OrderedDict[str, Tuple[Optional[int], float]]" = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _is_fresh(self, telegram_id: Optional[int], resolved_at: float) -> bool:
+        ttl = self.ttl if telegram_id is not None else self.negative_ttl
+        return time.time() - resolved_at < ttl
+
+    def _remember(self, username: str, telegram_id: Optional[int], resolved_at: float):
+        self._entries[username] = (telegram_id, resolved_at)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, username: str) -> Tuple[bool, Optional[int]]:
+        """Возвращает (найдено ли в кэше, telegram_id)."""
+        key = username.lower()
+        entry = self._entries.get(key)
+        if entry is not None and self._is_fresh(*entry):
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return True, entry[0]
+
+        entry = await self.db.get_cached_telegram_id(key)
+        if entry is not None and self._is_fresh(*entry):
+            self._remember(key, *entry)
+            self.db_hits += 1
+            return True, entry[0]
+
+        self.misses += 1
+        return False, None
+
+    async def set(self, username: str, telegram_id: Optional[int]):
+        key = username.lower()
+        resolved_at = time.time()
+        self._remember(key, telegram_id, resolved_at)
+        await self.db.save_cached_telegram_id(key, telegram_id, resolved_at)
+
+    async def preload(self):
+        """Заполняет кэш в памяти данными уже зарегистрированных игроков."""
+        now = time.time()
+        # Записи идут от новых к старым — добавляем в обратном порядке, чтобы новые остались «свежими» в LRU
+        for username, telegram_id in reversed(await self.db.get_known_telegram_ids(self.max_size)):
+            self._remember(username, telegram_id, now)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.memory_hits + self.db_hits + self.misses
+        return (self.memory_hits + self.db_hits) / total if total else 0.0
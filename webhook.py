@@ -0,0 +1,193 @@
+# webhook.py
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import signal
+from typing import Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Режим вебхука включается, если задан публичный адрес бота
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+# Секрет, который Telegram передаёт в X-Telegram-Bot-Api-Secret-Token; если не задан,
+# при каждом запуске генерируется новый и передаётся в set_webhook
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+# Сколько обновлений может ждать обработки; сверх этого Telegram получает 503 и повторит доставку позже
+WEBHOOK_MAX_QUEUE = int(os.environ.get("WEBHOOK_MAX_QUEUE", 1000))
+# Сколько одновременных соединений Telegram может открыть к вебхуку
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", 40))
+# Максимальный размер тела запроса, байт
+MAX_BODY_SIZE = 1024 * 1024
+# Сколько ждать заголовков и тела запроса, секунд; медленный клиент не должен держать соединение вечно
+WEBHOOK_READ_TIMEOUT = float(os.environ.get("WEBHOOK_READ_TIMEOUT", 10))
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class WebhookServer:
+    """Встроенный асинхронный HTTP-сервер, принимающий обновления Telegram.
+
+    Проверяет заголовок X-Telegram-Bot-Api-Secret-Token (без секрета сервер не работает:
+    если он не передан, генерируется случайный) и кладёт обновления
+    в application.update_queue. Если очередь переполнена, отвечает 503, и Telegram
+    доставляет обновление повторно.
+    """
+
+    def __init__(self, application: Application, path: str = WEBHOOK_PATH,
+                 secret_token: Optional[str] = WEBHOOK_SECRET, max_queue: int = WEBHOOK_MAX_QUEUE,
+                 read_timeout: float = WEBHOOK_READ_TIMEOUT):
+        self.application = application
+        self.read_timeout = read_timeout
+        self.path = path
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.max_queue = max_queue
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.accepted = 0
+        self.rejected = 0
+
+    async def start(self, listen: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT):
+        self._server = await asyncio.start_server(self._handle_connection, listen, port)
+        logger.info(f"Webhook server listening on {listen}:{port}{self.path}")
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # Соединение keep-alive: обрабатываем запросы, пока клиент его не закроет
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.read_timeout)
+                    status, keep_alive = await self._handle_request(head, reader)
+                    writer.write(
+                        f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                        f"Content-Length: 0\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                    )
+                    await writer.drain()
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                    # Клиент не дослал запрос, не уложился в таймаут или оборвал соединение — отвечать некому
+                    return
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def _handle_request(self, head: bytes, reader: asyncio.StreamReader) -> Tuple[int, bool]:
+        """Возвращает HTTP-статус ответа и признак того, что соединение можно оставить открытым."""
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            return 400, False
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        keep_alive = headers.get("connection", "").lower() != "close"
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return 400, False
+        if length < 0:
+            return 400, False
+        if length > MAX_BODY_SIZE:
+            return 413, False
+
+        # Путь и секрет проверяются до чтения тела; непрочитанное тело не даёт продолжить соединение
+        if target.split("?", 1)[0] != self.path:
+            return 404, keep_alive and not length
+        if method != "POST":
+            return 405, keep_alive and not length
+        if not hmac.compare_digest(
+            headers.get("x-telegram-bot-api-secret-token", ""), self.secret_token
+        ):
+            return 403, keep_alive and not length
+
+        body = await asyncio.wait_for(reader.readexactly(length), self.read_timeout) if length else b""
+
+        if self.application.update_queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            return 503, keep_alive
+
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            logger.warning(f"Invalid JSON received on webhook: {e}")
+            return 400, keep_alive
+        if not isinstance(payload, dict):
+            logger.warning(f"Webhook body is not a JSON object: {type(payload).__name__}")
+            return 400, keep_alive
+        try:
+            update = Update.de_json(payload, self.application.bot)
+        except Exception as e:
+            logger.warning(f"Invalid update received on webhook: {e!r}")
+            return 400, keep_alive
+
+        self.application.update_queue.put_nowait(update)
+        self.accepted += 1
+        return 200, keep_alive
+
+
+async def run_webhook(application: Application):
+    """Запускает приложение в режиме вебхука до получения SIGINT/SIGTERM."""
+    server = WebhookServer(application)
+    REGISTRY.register_collector("bot_webhook", lambda: {
+        'accepted': server.accepted,
+        'rejected': server.rejected,
+        'queue_size': application.update_queue.qsize(),
+    })
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # run_polling сам вызывает post_init/post_shutdown, здесь это нужно сделать вручную
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=server.secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+        await stop.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)